@@ -0,0 +1,117 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Command line entry point for the login cycle benchmarks.
+
+The scenarios run in a test database that is flushed between them, and
+the results are written as JSON with sorted keys so that runs from
+different commits can be compared with an ordinary diff.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import sys
+from collections import OrderedDict
+
+
+def parse_args(argv, scenario_names):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmark the OpenID login_begin/login_complete cycle.')
+    parser.add_argument(
+        '--iterations', type=int, default=200,
+        help='Number of measured login cycles per scenario.')
+    parser.add_argument(
+        '--warmup', type=int, default=10,
+        help='Number of unmeasured login cycles run first.')
+    parser.add_argument(
+        '--scenario', action='append', choices=scenario_names,
+        dest='scenarios',
+        help='Scenario to run; may be repeated.  Defaults to all of them.')
+    parser.add_argument(
+        '--output', default='-',
+        help='File to write the JSON results to, or - for stdout.')
+    args = parser.parse_args(argv)
+    if args.iterations < 1:
+        parser.error('--iterations must be at least 1')
+    return args
+
+
+def main(argv=None):
+    os.environ.setdefault(
+        'DJANGO_SETTINGS_MODULE', 'example_consumer.settings')
+    import django
+    django.setup()
+
+    import openid
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment, teardown_test_environment)
+
+    from benchmarks.scenarios import SCENARIOS, run_scenario
+
+    args = parse_args(argv, list(SCENARIOS))
+    results = OrderedDict()
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True)
+    try:
+        for name in args.scenarios or SCENARIOS:
+            call_command('flush', interactive=False, verbosity=0)
+            results[name] = run_scenario(
+                SCENARIOS[name](), args.iterations, args.warmup)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    report = OrderedDict([
+        ('environment', OrderedDict([
+            ('python', platform.python_version()),
+            ('django', django.get_version()),
+            ('openid', getattr(openid, '__version__', None)),
+            ('database', connection.vendor),
+        ])),
+        ('iterations', args.iterations),
+        ('warmup', args.warmup),
+        ('scenarios', results),
+    ])
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Login cycle scenarios driven through the Django test client."""
+
+from __future__ import division, unicode_literals
+
+import math
+from collections import OrderedDict
+from timeit import default_timer
+
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from openid.extensions import sreg
+from openid.fetchers import getDefaultFetcher, setDefaultFetcher
+from openid.server.server import ENCODE_URL
+from six.moves.urllib.parse import parse_qsl
+
+try:
+    from django.urls import reverse
+except ImportError:
+    from django.core.urlresolvers import reverse
+
+from django_openid_auth import teams
+from django_openid_auth.models import UserOpenID
+from django_openid_auth.tests.test_views import StubOpenIDProvider
+
+
+BASE_SETTINGS = {
+    'ROOT_URLCONF': 'django_openid_auth.tests.urls',
+    'OPENID_SSO_SERVER_URL': None,
+    'OPENID_CREATE_USERS': True,
+    'OPENID_UPDATE_DETAILS_FROM_SREG': True,
+    'OPENID_LAUNCHPAD_TEAMS_MAPPING': {},
+    'OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO': False,
+}
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+class RequestSamples(object):
+    """Durations and query counts recorded for one view."""
+
+    def __init__(self):
+        self.durations = []
+        self.queries = []
+
+    def record(self, duration, queries):
+        self.durations.append(duration)
+        self.queries.append(queries)
+
+    def summary(self):
+        total = sum(self.durations)
+        count = len(self.durations)
+        return OrderedDict([
+            ('requests', count),
+            ('requests_per_second',
+             round(count / total, 1) if total else None),
+            ('p50_ms', round(percentile(self.durations, 50) * 1000, 3)),
+            ('p99_ms', round(percentile(self.durations, 99) * 1000, 3)),
+            ('queries_per_request', round(sum(self.queries) / count, 2)),
+        ])
+
+
+class Scenario(object):
+    """A kind of login to benchmark.
+
+    Subclasses describe the settings and fixture data for the login, and
+    what the provider sends back for each iteration.  Work done in the
+    hooks is not included in the measurements.
+    """
+
+    name = None
+    settings = {}
+    identity_url = 'http://example.com/identity'
+    nickname = 'someuser'
+
+    def set_up(self):
+        pass
+
+    def tear_down_iteration(self, iteration):
+        pass
+
+    def sreg_data(self, iteration):
+        return {
+            'nickname': self.nickname,
+            'fullname': 'Some User',
+            'email': 'someuser@example.com',
+        }
+
+    def teams(self, iteration):
+        return None
+
+
+class NewUserScenario(Scenario):
+    """A first login, which creates the user."""
+
+    name = 'new_user'
+
+    def tear_down_iteration(self, iteration):
+        User.objects.filter(username=self.nickname).delete()
+
+
+class ReturningUserScenario(Scenario):
+    """A login by a user who already has an account."""
+
+    name = 'returning_user'
+
+    def set_up(self):
+        user = User.objects.create_user(
+            self.nickname, 'someuser@example.com',
+            first_name='Some', last_name='User')
+        UserOpenID.objects.create(
+            user=user, claimed_id=self.identity_url,
+            display_id=self.identity_url)
+
+
+class TeamHeavyScenario(ReturningUserScenario):
+    """A returning user in many mapped teams, whose membership changes."""
+
+    name = 'team_heavy'
+    team_count = 100
+    member_count = 50
+
+    def __init__(self):
+        self.team_names = ['team%d' % i for i in range(self.team_count)]
+        self.settings = {
+            'OPENID_LAUNCHPAD_TEAMS_MAPPING': dict(
+                (name, 'group-' + name) for name in self.team_names),
+        }
+
+    def set_up(self):
+        super(TeamHeavyScenario, self).set_up()
+        Group.objects.bulk_create(
+            Group(name='group-' + name) for name in self.team_names)
+
+    def teams(self, iteration):
+        # Shift the membership window on every login so that each one
+        # both adds and removes groups.
+        start = (iteration % 2) * (self.member_count // 2)
+        return self.team_names[start:start + self.member_count]
+
+
+class StrictUsernameScenario(ReturningUserScenario):
+    """A returning user checked against strict, followed usernames."""
+
+    name = 'strict_username'
+    settings = {
+        'OPENID_STRICT_USERNAMES': True,
+        'OPENID_FOLLOW_RENAMES': True,
+    }
+
+
+SCENARIOS = OrderedDict(
+    (scenario.name, scenario) for scenario in [
+        NewUserScenario,
+        ReturningUserScenario,
+        TeamHeavyScenario,
+        StrictUsernameScenario,
+    ])
+
+
+class LoginCycle(object):
+    """Runs login_begin and login_complete against a stub provider."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.login_url = reverse('openid-login')
+
+    def measure(self, samples, method, *args):
+        with CaptureQueriesContext(connection) as queries:
+            start = default_timer()
+            response = method(*args)
+            duration = default_timer() - start
+        samples.record(duration, len(queries))
+        return response
+
+    def run(self, begin, complete, sreg_data, team_names=None):
+        client = Client()
+        response = self.measure(
+            begin, client.post, self.login_url,
+            {'openid_identifier': self.provider.identity_url})
+        assert response.status_code == 200, response.status_code
+
+        openid_request = self.provider.parseFormPost(
+            response.content.decode('utf-8'))
+        openid_response = openid_request.answer(True)
+        sreg_request = sreg.SRegRequest.fromOpenIDRequest(openid_request)
+        openid_response.addExtension(
+            sreg.SRegResponse.extractResponse(sreg_request, sreg_data))
+        if team_names is not None:
+            teams_request = teams.TeamsRequest.fromOpenIDRequest(
+                openid_request)
+            openid_response.addExtension(
+                teams.TeamsResponse.extractResponse(
+                    teams_request, ','.join(team_names)))
+        openid_response.whichEncoding = lambda: ENCODE_URL
+        webresponse = self.provider.server.encodeResponse(openid_response)
+        path, query = webresponse.headers['location'].split('?', 1)
+
+        response = self.measure(
+            complete, client.get, reverse('openid-complete'),
+            dict(parse_qsl(query)))
+        assert response.status_code == 302, response.status_code
+
+
+def run_scenario(scenario, iterations, warmup=0):
+    """Benchmark a scenario and return a summary of its login requests.
+
+    The scenario's fixture data is created in the current database, so
+    callers are responsible for running it inside a disposable one.
+    """
+    provider = StubOpenIDProvider('http://example.com/')
+    previous_fetcher = getDefaultFetcher()
+    setDefaultFetcher(provider, wrap_exceptions=False)
+    settings = dict(BASE_SETTINGS, **scenario.settings)
+    try:
+        with override_settings(**settings):
+            cycle = LoginCycle(provider)
+            scenario.set_up()
+            begin, complete = RequestSamples(), RequestSamples()
+            for iteration in range(warmup + iterations):
+                if iteration == warmup:
+                    begin, complete = RequestSamples(), RequestSamples()
+                cycle.run(
+                    begin, complete, scenario.sreg_data(iteration),
+                    scenario.teams(iteration))
+                scenario.tear_down_iteration(iteration)
+    finally:
+        setDefaultFetcher(previous_fetcher, wrap_exceptions=False)
+
+    return OrderedDict([
+        ('login_begin', begin.summary()),
+        ('login_complete', complete.summary()),
+    ])
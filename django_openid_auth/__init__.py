@@ -29,3 +29,5 @@
 import sys
 
 PY3 = sys.version_info.major >= 3
+
+default_app_config = 'django_openid_auth.apps.DjangoOpenIDAuthConfig'
@@ -0,0 +1,128 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Establishing associations with providers ahead of logins.
+
+Without an association, or when it has expired, the next login has to
+wait for a Diffie-Hellman association negotiation with the provider.
+renew_associations() makes sure there is an association with each of
+the given providers that stays valid for a while yet, negotiating a new
+one if not.  Run it regularly through the openid_renew_associations
+management command, so that logins always find a current association.
+"""
+
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from django.conf import settings
+from openid.consumer.consumer import GenericConsumer
+from openid.consumer.discover import DiscoveryFailure
+from openid.fetchers import HTTPFetchingError
+
+from django_openid_auth import discovery
+from django_openid_auth.exceptions import AssociationRenewalFailed
+from django_openid_auth.fetchers import install_fetcher
+from django_openid_auth.store import get_store
+
+
+RenewalResult = namedtuple(
+    'RenewalResult', ['server_url', 'handle', 'renewed', 'expires_in'])
+
+
+def get_renew_before():
+    """Return how long before expiry associations should be renewed."""
+    return getattr(settings, 'OPENID_ASSOCIATION_RENEW_BEFORE', 3600)
+
+
+def get_renewal_identifiers():
+    """Return the identifiers of the providers to keep associations with."""
+    identifier = getattr(settings, 'OPENID_SSO_SERVER_URL', None)
+    return [identifier] if identifier else []
+
+
+def renew_association(identifier, store=None, renew_before=None):
+    """Make sure there is an association with the provider at identifier
+    that is valid for at least renew_before more seconds.
+
+    The provider is found the same way login_begin would find it, through
+    discovery.  Returns a RenewalResult, or raises AssociationRenewalFailed
+    if discovery or the association negotiation fails.
+    """
+    if store is None:
+        store = get_store()
+    if renew_before is None:
+        renew_before = get_renew_before()
+    install_fetcher()
+
+    try:
+        claimed_id, services = discovery.discover(identifier)
+    except (DiscoveryFailure, HTTPFetchingError) as exc:
+        raise AssociationRenewalFailed(
+            'OpenID discovery error for %s: %s' % (identifier, exc))
+    if not services:
+        raise AssociationRenewalFailed(
+            'No usable OpenID services found for %s' % identifier)
+    # Consumer.begin() uses the first of the discovered services.
+    endpoint = services[0]
+
+    assoc = store.getAssociation(endpoint.server_url)
+    if assoc is not None and assoc.expiresIn > renew_before:
+        return RenewalResult(
+            endpoint.server_url, assoc.handle, False, assoc.expiresIn)
+
+    assoc = GenericConsumer(store)._negotiateAssociation(endpoint)
+    if assoc is None:
+        raise AssociationRenewalFailed(
+            'Could not establish an association with %s' %
+            endpoint.server_url)
+    store.storeAssociation(endpoint.server_url, assoc)
+    return RenewalResult(
+        endpoint.server_url, assoc.handle, True, assoc.expiresIn)
+
+
+def renew_associations(identifiers=None, store=None, renew_before=None):
+    """Renew the associations with each of the given providers, by
+    default OPENID_SSO_SERVER_URL, that are close to expiry.
+
+    Returns a list of (identifier, result) pairs, where result is either
+    a RenewalResult or the AssociationRenewalFailed raised for that
+    provider.
+    """
+    if identifiers is None:
+        identifiers = get_renewal_identifiers()
+    if store is None:
+        store = get_store()
+    results = []
+    for identifier in identifiers:
+        try:
+            result = renew_association(identifier, store, renew_before)
+        except AssociationRenewalFailed as exc:
+            result = exc
+        results.append((identifier, result))
+    return results
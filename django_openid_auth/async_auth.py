@@ -0,0 +1,52 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Async authentication for OpenIDBackend.
+
+OpenIDBackend gets aauthenticate() from AsyncAuthenticationMixin on
+Python 3 when asgiref is installed, as it is for Django 3.0 onwards.
+
+The versions of Django this package supports have no async ORM methods
+for the lookups and updates a login makes, so aauthenticate() runs
+authenticate() in the thread used for the request's other synchronous
+work, as Django's own backends do.  That keeps the login's queries on
+the same connection as the rest of the request, so they are counted by
+the login timings too.
+"""
+
+from __future__ import unicode_literals
+
+from asgiref.sync import sync_to_async
+
+
+class AsyncAuthenticationMixin(object):
+    """Async versions of OpenIDBackend's methods that use the database."""
+
+    async def aauthenticate(self, request=None, **kwargs):
+        """Async version of authenticate()."""
+        return await sync_to_async(self.authenticate)(request, **kwargs)
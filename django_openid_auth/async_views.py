@@ -0,0 +1,132 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Async versions of the login views, for sites served over ASGI.
+
+python-openid and the association and nonce stores are synchronous, so
+these views keep the database and session work in the request's sync
+thread.  The outbound HTTP requests of discovery, which account for most
+of a login's wall clock time, run in a separate thread pool instead, so
+that they don't hold up the request's thread while waiting on the
+provider.
+
+These views need Django 3.1 or later.  Enable them in django_openid_auth's
+URLs with the OPENID_ASYNC_VIEWS setting.
+"""
+
+from __future__ import unicode_literals
+
+try:
+    from urllib.parse import urldefrag
+except ImportError:
+    from urlparse import urldefrag
+
+import django
+from django.conf import settings
+from django.contrib.auth import REDIRECT_FIELD_NAME
+from django.core.exceptions import ImproperlyConfigured
+
+if django.VERSION < (3, 1):
+    raise ImproperlyConfigured(
+        'OPENID_ASYNC_VIEWS requires Django 3.1 or later.')
+
+from asgiref.sync import sync_to_async
+from openid.consumer.consumer import Consumer
+
+from django_openid_auth import views
+from django_openid_auth.discovery import PrefetchedDiscovery
+from django_openid_auth.forms import OpenIDLoginForm
+from django_openid_auth.session import ConsumerSession
+
+
+async def prefetch_discovery(request, identifier):
+    """Discover identifier off the request's thread, for make_consumer()
+    to use once the sync part of the view runs."""
+    discovery = getattr(request, 'openid_discovery', None)
+    if discovery is None:
+        discovery = request.openid_discovery = PrefetchedDiscovery()
+    await sync_to_async(discovery.prefetch, thread_sensitive=False)(
+        identifier)
+
+
+def get_openid_url(request, form_class):
+    """Return the identifier login_begin will start discovery from."""
+    openid_url = getattr(settings, 'OPENID_SSO_SERVER_URL', None)
+    if openid_url is None and request.POST:
+        # The form may be a custom one which uses the database.
+        login_form = form_class(data=request.POST)
+        if login_form.is_valid():
+            openid_url = login_form.cleaned_data['openid_identifier']
+    return openid_url
+
+
+def needs_rediscovery(request, claimed_id):
+    """Return whether completing the login will rediscover claimed_id.
+
+    python-openid rediscovers the claimed identifier unless it matches
+    the endpoint saved in the session by login_begin, as it won't for an
+    OP identifier such as OPENID_SSO_SERVER_URL.
+    """
+    session = ConsumerSession(request.session)
+    endpoint = session.get(Consumer.session_key_prefix + Consumer._token)
+    return (endpoint is None or endpoint.isOPIdentifier() or
+            endpoint.claimed_id != urldefrag(claimed_id)[0])
+
+
+async def login_begin(request, template_name='openid/login.html',
+                      login_complete_view='openid-complete',
+                      form_class=OpenIDLoginForm,
+                      render_failure=views.default_render_failure,
+                      redirect_field_name=REDIRECT_FIELD_NAME):
+    """Async version of views.login_begin."""
+    openid_url = await sync_to_async(get_openid_url)(request, form_class)
+    if openid_url is not None:
+        await prefetch_discovery(request, openid_url)
+
+    return await sync_to_async(views.login_begin)(
+        request, template_name=template_name,
+        login_complete_view=login_complete_view, form_class=form_class,
+        render_failure=render_failure,
+        redirect_field_name=redirect_field_name)
+
+
+async def login_complete(request, redirect_field_name=REDIRECT_FIELD_NAME,
+                         render_failure=None):
+    """Async version of views.login_complete."""
+    claimed_id = views.get_request_data(request).get('openid.claimed_id')
+    if claimed_id and await sync_to_async(needs_rediscovery)(
+            request, claimed_id):
+        await prefetch_discovery(request, claimed_id)
+
+    return await sync_to_async(views.login_complete)(
+        request, redirect_field_name=redirect_field_name,
+        render_failure=render_failure)
+
+
+# csrf_exempt() only supports async views from Django 5.0 onwards.
+login_complete.csrf_exempt = True
@@ -32,15 +32,20 @@ from __future__ import unicode_literals
 
 import re
 
+import django
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import Group
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router, transaction
 from openid.consumer.consumer import SUCCESS
 from openid.extensions import ax, sreg, pape
 
-from django_openid_auth import teams
-from django_openid_auth.models import UserOpenID
+from django_openid_auth import PY3, teams
+from django_openid_auth.models import (
+    UserOpenID,
+    get_account_verified_permission_id,
+)
 from django_openid_auth.exceptions import (
     IdentityAlreadyClaimed,
     DuplicateUsernameViolation,
@@ -48,7 +53,13 @@ from django_openid_auth.exceptions import (
     MissingPhysicalMultiFactor,
     RequiredAttributeNotReturned,
 )
+from django_openid_auth.instrumentation import (
+    UPDATE_GROUPS,
+    UPDATE_USER_DETAILS,
+    login_phase,
+)
 from django_openid_auth.signals import openid_duplicate_username
+from django_openid_auth.teams_mapping import get_teams_mapping
 
 
 User = get_user_model()
@@ -91,8 +102,26 @@ def get_user_group_model():
 
 UserGroup = get_user_group_model()
 
-
-class OpenIDBackend(object):
+# SHIM: ignore_conflicts is only available from Django 2.2.  It lets a
+# concurrent login that already added the same membership win quietly.
+if django.VERSION >= (2, 2):
+    BULK_CREATE_IGNORE_CONFLICTS = {'ignore_conflicts': True}
+else:
+    BULK_CREATE_IGNORE_CONFLICTS = {}
+
+# SHIM: aauthenticate() needs Python 3 and asgiref, which Django depends
+# on from 3.0.
+try:
+    import asgiref
+except ImportError:
+    asgiref = None
+if PY3 and asgiref is not None:
+    from django_openid_auth.async_auth import AsyncAuthenticationMixin
+else:
+    AsyncAuthenticationMixin = object
+
+
+class OpenIDBackend(AsyncAuthenticationMixin):
     """A django.contrib.auth backend that authenticates the user based on
     an OpenID response."""
 
@@ -125,7 +154,7 @@ class OpenIDBackend(object):
 
         user = None
         try:
-            user_openid = UserOpenID.objects.get(
+            user_openid = UserOpenID.objects.select_related('user').get(
                 claimed_id__exact=openid_response.identity_url)
         except UserOpenID.DoesNotExist:
             if getattr(settings, 'OPENID_CREATE_USERS', False):
@@ -138,40 +167,55 @@ class OpenIDBackend(object):
 
         if getattr(settings, 'OPENID_UPDATE_DETAILS_FROM_SREG', False):
             details = self._extract_user_details(openid_response)
-            self.update_user_details(user, details, openid_response)
+            with login_phase(UPDATE_USER_DETAILS, request):
+                self.update_user_details(user, details, openid_response)
 
-        if getattr(settings, 'OPENID_PHYSICAL_MULTIFACTOR_REQUIRED', False):
-            pape_response = pape.Response.fromSuccessResponse(openid_response)
-            key = pape.AUTH_MULTI_FACTOR_PHYSICAL
-            if (pape_response is None or
-                    key not in pape_response.auth_policies):
-                raise MissingPhysicalMultiFactor()
+        self._check_physical_multifactor(openid_response)
 
         teams_response = teams.TeamsResponse.fromSuccessResponse(
             openid_response)
         if teams_response:
-            self.update_groups_from_teams(user, teams_response)
-            self.update_staff_status_from_teams(user, teams_response)
+            with login_phase(UPDATE_GROUPS, request):
+                self.update_groups_from_teams(user, teams_response)
+                self.update_staff_status_from_teams(user, teams_response)
 
-        teams_required = getattr(settings,
-                                 'OPENID_LAUNCHPAD_TEAMS_REQUIRED', [])
-        if teams_required:
-            teams_mapping = self.get_teams_mapping()
-            groups_required = [group for team, group in teams_mapping.items()
-                               if team in teams_required]
+        groups_required = self._get_groups_required()
+        if groups_required is not None:
             user_groups = UserGroup.objects.filter(user=user)
             matches = set(groups_required).intersection(
                 user_groups.values_list('group__name', flat=True))
-            if not matches:
-                name = 'OPENID_EMAIL_WHITELIST_REGEXP_LIST'
-                whitelist_regexp_list = getattr(settings, name, [])
-                for pattern in whitelist_regexp_list:
-                    if re.match(pattern, user.email):
-                        return user
+            if not matches and not self._is_email_whitelisted(user.email):
                 return None
 
         return user
 
+    def _check_physical_multifactor(self, openid_response):
+        if getattr(settings, 'OPENID_PHYSICAL_MULTIFACTOR_REQUIRED', False):
+            pape_response = pape.Response.fromSuccessResponse(openid_response)
+            key = pape.AUTH_MULTI_FACTOR_PHYSICAL
+            if (pape_response is None or
+                    key not in pape_response.auth_policies):
+                raise MissingPhysicalMultiFactor()
+
+    def _get_groups_required(self):
+        """Return the groups mapped to OPENID_LAUNCHPAD_TEAMS_REQUIRED, or
+        None if no teams are required."""
+        teams_required = getattr(settings,
+                                 'OPENID_LAUNCHPAD_TEAMS_REQUIRED', [])
+        if not teams_required:
+            return None
+        teams_mapping = self.get_teams_mapping()
+        return [group for team, group in teams_mapping.items()
+                if team in teams_required]
+
+    def _is_email_whitelisted(self, email):
+        name = 'OPENID_EMAIL_WHITELIST_REGEXP_LIST'
+        whitelist_regexp_list = getattr(settings, name, [])
+        for pattern in whitelist_regexp_list:
+            if re.match(pattern, email):
+                return True
+        return False
+
     def _extract_user_details(self, openid_response):
         email = fullname = first_name = last_name = nickname = None
         verified = 'no'
@@ -277,10 +321,28 @@ class OpenIDBackend(object):
         # Pick a username for the user based on their nickname,
         # checking for conflicts.  Start with number of existing users who's
         # username starts with this nickname to avoid having to iterate over
-        # all of the existing ones.
-        i = User.objects.filter(username__startswith=nickname).count() + 1
+        # all of the existing ones.  The candidates are all checked against
+        # a single fetch of the usernames of the form nickname+i, so the
+        # number of queries does not grow with the number of collisions.
+        # MySQL compiles startswith and regex to case-sensitive BINARY
+        # comparisons, while the unique index on username usually uses a
+        # case-insensitive collation, so fold case there.  Elsewhere keep
+        # the case-sensitive lookups, which can use the username index.
+        ignore_case = (
+            connections[router.db_for_read(User)].vendor == 'mysql')
+        lookup = 'username__i%s' if ignore_case else 'username__%s'
+
+        def fold(username):
+            return username.lower() if ignore_case else username
+
+        i = User.objects.filter(
+            **{lookup % 'startswith': nickname}).count() + 1
+        taken = set(
+            fold(username) for username in User.objects.filter(
+                **{lookup % 'regex': r'^%s[0-9]*$' % re.escape(nickname)}
+            ).values_list('username', flat=True))
         username = nickname
-        while User.objects.filter(username=username).exists():
+        while fold(username) in taken:
             username = nickname + str(i)
             i += 1
 
@@ -361,48 +423,54 @@ class OpenIDBackend(object):
 
         return user_openid
 
-    def update_user_details(self, user, details, openid_response):
-        updated = False
+    def _set_user_details(self, user, details, username=None):
+        """Set the user's fields from details, returning the names of the
+        fields whose values actually changed."""
+        updated_fields = []
+
+        def update_field(name, value):
+            if getattr(user, name) != value:
+                setattr(user, name, value)
+                updated_fields.append(name)
+
         if details['first_name']:
-            user.first_name = details['first_name'][:30]
-            updated = True
+            update_field('first_name', details['first_name'][:30])
         if details['last_name']:
-            user.last_name = details['last_name'][:30]
-            updated = True
+            update_field('last_name', details['last_name'][:30])
         if details['email']:
-            user.email = details['email']
-            updated = True
+            update_field('email', details['email'])
+        if username is not None:
+            update_field('username', username)
+        return updated_fields
+
+    def update_user_details(self, user, details, openid_response):
+        # Only write the fields whose values actually changed, so that a
+        # returning user with unchanged details costs no UPDATE at all.
+        username = None
         if getattr(settings, 'OPENID_FOLLOW_RENAMES', False):
-            user.username = self._get_available_username(
+            username = self._get_available_username(
                 details['nickname'], openid_response.identity_url)
-            updated = True
+        updated_fields = self._set_user_details(user, details, username)
         account_verified = details.get('account_verified', None)
         if (account_verified is not None):
-            permission = Permission.objects.get(codename='account_verified')
-            perm_label = '%s.%s' % (permission.content_type.app_label,
-                                    permission.codename)
-            if account_verified and not user.has_perm(perm_label):
-                user.user_permissions.add(permission)
-            elif not account_verified and user.has_perm(perm_label):
-                user.user_permissions.remove(permission)
-
-        if updated:
-            user.save()
+            # Check the user's own permissions directly rather than with
+            # has_perm(), which would load all of the user's and their
+            # groups' permissions.
+            permission_id = get_account_verified_permission_id()
+            user_field = User.user_permissions.field.m2m_field_name()
+            has_permission = User.user_permissions.through.objects.filter(
+                **{user_field: user.pk, 'permission': permission_id}
+            ).exists()
+            if account_verified and not has_permission:
+                user.user_permissions.add(permission_id)
+            elif not account_verified and has_permission:
+                user.user_permissions.remove(permission_id)
+
+        if updated_fields:
+            user.save(update_fields=updated_fields)
 
     def get_teams_mapping(self):
-        teams_mapping_auto = getattr(
-            settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO', False)
-        teams_mapping_auto_blacklist = getattr(
-            settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO_BLACKLIST', [])
-        teams_mapping = getattr(settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING', {})
-        if teams_mapping_auto:
-            # ignore teams_mapping. use all django-groups
-            teams_mapping = dict()
-            all_groups = Group.objects.exclude(
-                name__in=teams_mapping_auto_blacklist)
-            for group in all_groups:
-                teams_mapping[group.name] = group.name
-        return teams_mapping
+        return get_teams_mapping()
 
     def update_groups_from_teams(self, user, teams_response):
         teams_mapping = self.get_teams_mapping()
@@ -412,28 +480,39 @@ class OpenIDBackend(object):
         mapping = [
             teams_mapping[lp_team] for lp_team in teams_response.is_member
             if lp_team in teams_mapping]
-        user_groups = UserGroup.objects.filter(user=user)
-        matching_groups = user_groups.filter(
-            group__name__in=teams_mapping.values())
-        current_groups = set(
-            user_group.group for user_group in matching_groups)
-        desired_groups = set(Group.objects.filter(name__in=mapping))
-        groups_to_remove = current_groups - desired_groups
-        groups_to_add = desired_groups - current_groups
-        user_groups.filter(group__in=groups_to_remove).delete()
-        for group in groups_to_add:
-            UserGroup.objects.create(user=user, group=group)
-
-    def update_staff_status_from_teams(self, user, teams_response):
+        # Work with group ids only, so that the number of queries does
+        # not depend on how many teams the user is a member of.
+        with transaction.atomic():
+            user_groups = UserGroup.objects.filter(user=user)
+            current_group_ids = set(user_groups.filter(
+                group__name__in=teams_mapping.values()).values_list(
+                    'group_id', flat=True))
+            desired_group_ids = set(Group.objects.filter(
+                name__in=mapping).values_list('id', flat=True))
+            group_ids_to_remove = current_group_ids - desired_group_ids
+            group_ids_to_add = desired_group_ids - current_group_ids
+            if group_ids_to_remove:
+                user_groups.filter(group_id__in=group_ids_to_remove).delete()
+            if group_ids_to_add:
+                UserGroup.objects.bulk_create(
+                    [UserGroup(user=user, group_id=group_id)
+                     for group_id in sorted(group_ids_to_add)],
+                    **BULK_CREATE_IGNORE_CONFLICTS)
+
+    def _is_staff_from_teams(self, teams_response):
+        """Return whether the user's teams make them staff, or None if
+        staff status is not managed through teams."""
         if not hasattr(settings, 'OPENID_LAUNCHPAD_STAFF_TEAMS'):
-            return
+            return None
 
         staff_teams = getattr(settings, 'OPENID_LAUNCHPAD_STAFF_TEAMS', [])
-        user.is_staff = False
-
         for lp_team in teams_response.is_member:
             if lp_team in staff_teams:
-                user.is_staff = True
-                break
+                return True
+        return False
 
-        user.save()
+    def update_staff_status_from_teams(self, user, teams_response):
+        is_staff = self._is_staff_from_teams(teams_response)
+        if is_staff is not None and user.is_staff != is_staff:
+            user.is_staff = is_staff
+            user.save(update_fields=['is_staff'])
@@ -0,0 +1,180 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Caching of OpenID discovery results."""
+
+from __future__ import unicode_literals
+
+import hashlib
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from openid import fetchers
+from openid.consumer import discover as openid_discover
+from openid.yadis import xri
+
+
+max_age_re = re.compile(r'max-age\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+# The responses fetched by the current thread's discovery, if any.
+_recording = threading.local()
+_install_lock = threading.Lock()
+
+
+class HeaderRecordingFetcher(fetchers.HTTPFetcher):
+    """Pass requests through to another fetcher, keeping the responses
+    fetched by threads in the middle of discovery so that their caching
+    headers can be inspected afterwards."""
+
+    def __init__(self, fetcher):
+        super(HeaderRecordingFetcher, self).__init__()
+        self.fetcher = fetcher
+
+    def fetch(self, url, body=None, headers=None):
+        response = self.fetcher.fetch(url, body, headers)
+        responses = getattr(_recording, 'responses', None)
+        if responses is not None:
+            responses.append(response)
+        return response
+
+
+def install_recording_fetcher():
+    """Wrap python-openid's default fetcher in a HeaderRecordingFetcher,
+    unless that has been done already."""
+    with _install_lock:
+        current = fetchers.getDefaultFetcher()
+        if not isinstance(current, HeaderRecordingFetcher):
+            fetchers.setDefaultFetcher(
+                HeaderRecordingFetcher(current), wrap_exceptions=False)
+
+
+def get_max_age(response):
+    """Return how long response may be cached for, according to its
+    Cache-Control header, or None if the header does not say."""
+    headers = dict(
+        (key.lower(), value) for key, value in response.headers.items())
+    cache_control = headers.get('cache-control', '').lower()
+    if ('no-store' in cache_control or 'no-cache' in cache_control or
+            'private' in cache_control):
+        return 0
+    match = max_age_re.search(cache_control)
+    if match is not None:
+        return int(match.group(1))
+    return None
+
+
+def normalize_identifier(identifier):
+    """Normalize an identifier the same way discovery would."""
+    identifier = identifier.strip()
+    if xri.identifierScheme(identifier) == 'XRI':
+        return openid_discover.normalizeXRI(identifier)
+    if '://' not in identifier:
+        identifier = 'http://' + identifier
+    try:
+        return openid_discover.normalizeURL(identifier)
+    except openid_discover.DiscoveryFailure:
+        return identifier
+
+
+def get_discovery_cache():
+    alias = getattr(settings, 'OPENID_DISCOVERY_CACHE_ALIAS', 'default')
+    return caches[alias]
+
+
+def _discover_recording_headers(identifier):
+    install_recording_fetcher()
+    _recording.responses = responses = []
+    try:
+        result = openid_discover.discover(identifier)
+    finally:
+        del _recording.responses
+    return result, responses
+
+
+def discover(identifier):
+    """Discover the OpenID services for identifier, using the cache.
+
+    Results are cached for OPENID_DISCOVERY_CACHE_TIMEOUT seconds, or
+    less if the responses fetched during discovery ask for it through
+    their Cache-Control headers.  Failed discoveries, and ones finding
+    no services, are not cached.
+    Without a timeout configured this is plain python-openid discovery.
+    """
+    timeout = getattr(settings, 'OPENID_DISCOVERY_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return openid_discover.discover(identifier)
+
+    cache = get_discovery_cache()
+    key = 'django_openid_auth:discovery:%s' % hashlib.sha1(
+        normalize_identifier(identifier).encode('utf-8')).hexdigest()
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    result, responses = _discover_recording_headers(identifier)
+    for response in responses:
+        max_age = get_max_age(response)
+        if max_age is not None:
+            timeout = min(timeout, max_age)
+    # A provider can answer with a page that has no OpenID services in
+    # it, e.g. while it is down for maintenance; don't hold on to that.
+    if timeout > 0 and result[1]:
+        cache.set(key, result, timeout)
+    return result
+
+
+class PrefetchedDiscovery(object):
+    """Discovery function answering from results fetched in advance.
+
+    The async views run discovery away from the request's thread, then
+    hand the results to the consumer through an instance of this class.
+    Identifiers that were not prefetched are discovered as usual.
+    """
+
+    def __init__(self):
+        self.results = {}
+
+    def prefetch(self, identifier):
+        """Discover identifier now, keeping the result or the failure."""
+        try:
+            self.results[identifier] = (discover(identifier), None)
+        except (openid_discover.DiscoveryFailure,
+                fetchers.HTTPFetchingError) as exc:
+            self.results[identifier] = (None, exc)
+
+    def __call__(self, identifier):
+        try:
+            result, error = self.results[identifier]
+        except KeyError:
+            return discover(identifier)
+        if error is not None:
+            raise error
+        return result
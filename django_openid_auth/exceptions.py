@@ -75,3 +75,12 @@ class MissingPhysicalMultiFactor(DjangoOpenIDException):
                 "Login requires physical multi-factor authentication.")
         else:
             self.message = message
+
+
+class AssociationRenewalFailed(DjangoOpenIDException):
+
+    def __init__(self, message=None):
+        if message is None:
+            self.message = "Could not establish an association."
+        else:
+            self.message = message
@@ -0,0 +1,224 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Extension requests added to outgoing OpenID authentication requests.
+
+The AX, SReg, PAPE and Launchpad teams requests only depend on the
+settings, the provider endpoint and (with automatic team mapping) the
+current teams mapping, so their arguments are computed once and reused
+until one of those changes.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from openid.extension import Extension
+from openid.extensions import ax, pape, sreg
+
+from django_openid_auth import teams
+from django_openid_auth.teams_mapping import (
+    get_teams_mapping,
+    is_auto_mapping,
+)
+
+
+class PrecomputedExtension(Extension):
+    """An extension request whose arguments have already been computed."""
+
+    def __init__(self, extension):
+        super(PrecomputedExtension, self).__init__()
+        self.ns_uri = extension.ns_uri
+        self.ns_alias = extension.ns_alias
+        self.args = extension.getExtensionArgs()
+
+    def getExtensionArgs(self):
+        return dict(self.args)
+
+
+class ExtensionRequestCache(object):
+    """A bounded LRU cache of precomputed extension requests, keyed by
+    endpoint.
+
+    Entries computed for one version of their inputs (the automatic
+    teams mapping) are dropped as soon as another version is asked for.
+    The cache size is read from the OPENID_EXTENSION_REQUEST_CACHE_SIZE
+    setting unless given explicitly, and defaults to 100 endpoints.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._version = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'OPENID_EXTENSION_REQUEST_CACHE_SIZE', 100)
+
+    def get(self, key, build, version=None):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            extensions = self._entries.pop(key, None)
+            if extensions is not None:
+                # Re-insert to mark the entry as most recently used.
+                self._entries[key] = extensions
+                return extensions
+            generation = self._generation
+
+        extensions = build()
+        max_size = self.max_size
+        with self._lock:
+            # Don't keep results computed from data that was invalidated
+            # while we were building them.
+            if (max_size > 0 and generation == self._generation and
+                    version == self._version):
+                self._entries[key] = extensions
+                while len(self._entries) > max_size:
+                    self._entries.popitem(last=False)
+        return extensions
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+
+extension_request_cache = ExtensionRequestCache()
+
+
+def build_extension_requests(endpoint, launchpad_teams=None):
+    """Return the extension requests to send to endpoint.
+
+    launchpad_teams is the teams mapping to request membership of; the
+    current mapping is used if it isn't given.
+    """
+    extensions = []
+
+    # Request some user details.  If the provider advertises support
+    # for attribute exchange, use that.
+    if endpoint.supportsType(ax.AXMessage.ns_uri):
+        fetch_request = ax.FetchRequest()
+        # We mark all the attributes as required, since Google ignores
+        # optional attributes.  We request both the full name and
+        # first/last components since some providers offer one but not
+        # the other.
+        for (attr, alias) in [
+                ('http://axschema.org/contact/email', 'email'),
+                ('http://axschema.org/namePerson', 'fullname'),
+                ('http://axschema.org/namePerson/first', 'firstname'),
+                ('http://axschema.org/namePerson/last', 'lastname'),
+                ('http://axschema.org/namePerson/friendly', 'nickname'),
+                # The myOpenID provider advertises AX support, but uses
+                # attribute names from an obsolete draft of the
+                # specification.  We request them for compatibility.
+                ('http://schema.openid.net/contact/email', 'old_email'),
+                ('http://schema.openid.net/namePerson', 'old_fullname'),
+                ('http://schema.openid.net/namePerson/friendly',
+                 'old_nickname')]:
+            fetch_request.add(ax.AttrInfo(attr, alias=alias, required=True))
+
+        # conditionally require account_verified attribute
+        verification_scheme_map = getattr(
+            settings, 'OPENID_VALID_VERIFICATION_SCHEMES', {})
+        valid_schemes = verification_scheme_map.get(
+            endpoint.server_url, verification_scheme_map.get(None, ()))
+        if valid_schemes:
+            # there are valid schemes configured for this endpoint, so
+            # request account_verified status
+            fetch_request.add(ax.AttrInfo(
+                'http://ns.login.ubuntu.com/2013/validation/account',
+                alias='account_verified', required=True))
+
+        extensions.append(fetch_request)
+    else:
+        sreg_required_fields = []
+        sreg_required_fields.extend(
+            getattr(settings, 'OPENID_SREG_REQUIRED_FIELDS', []))
+        sreg_optional_fields = ['email', 'fullname', 'nickname']
+        sreg_optional_fields.extend(
+            getattr(settings, 'OPENID_SREG_EXTRA_FIELDS', []))
+        sreg_optional_fields = [
+            field for field in sreg_optional_fields
+            if field not in sreg_required_fields]
+        extensions.append(
+            sreg.SRegRequest(optional=sreg_optional_fields,
+                             required=sreg_required_fields))
+
+    if getattr(settings, 'OPENID_PHYSICAL_MULTIFACTOR_REQUIRED', False):
+        preferred_auth = [
+            pape.AUTH_MULTI_FACTOR_PHYSICAL,
+        ]
+        extensions.append(
+            pape.Request(preferred_auth_policies=preferred_auth))
+
+    # Request team info
+    if launchpad_teams is None:
+        launchpad_teams = get_teams_mapping()
+    if launchpad_teams:
+        extensions.append(teams.TeamsRequest(launchpad_teams.keys()))
+
+    return extensions
+
+
+def get_extension_requests(endpoint):
+    """Return the extension requests to send to endpoint, reusing
+    previously computed ones where possible."""
+    key = (endpoint.server_url, endpoint.supportsType(ax.AXMessage.ns_uri))
+    launchpad_teams = None
+    version = None
+    if is_auto_mapping():
+        # The requested teams follow the groups, which may be changed by
+        # other processes, in bulk or behind a cache that isn't shared.
+        # Key on the mapping itself rather than on its cached version, so
+        # the requests are never staler than get_teams_mapping() is.
+        launchpad_teams = get_teams_mapping()
+        version = tuple(sorted(launchpad_teams))
+    return extension_request_cache.get(key, lambda: [
+        PrecomputedExtension(extension)
+        for extension in build_extension_requests(
+            endpoint, launchpad_teams)], version)
+
+
+@receiver(setting_changed)
+def clear_on_setting_changed(sender, setting, **kwargs):
+    if setting.startswith('OPENID_'):
+        extension_request_cache.clear()
@@ -0,0 +1,379 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""An HTTP fetcher for python-openid that keeps connections alive.
+
+python-openid's default fetcher opens a new connection, and for HTTPS
+does a new TLS handshake, for every discovery request and every
+association or direct verification POST.  PooledHTTPFetcher keeps idle
+connections to each provider host open for reuse, with a bound on the
+number of connections per host and on the number of hosts.
+
+Set OPENID_FETCHER_CLASS to use it, and make_consumer() will install it
+as python-openid's default fetcher.
+"""
+
+from __future__ import unicode_literals
+
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from openid.fetchers import (
+    MAX_RESPONSE_KB,
+    USER_AGENT,
+    HTTPFetcher,
+    HTTPFetchingError,
+    HTTPResponse,
+    getDefaultFetcher,
+    setDefaultFetcher,
+)
+from six import string_types
+from six.moves import http_client
+from six.moves.urllib.parse import urljoin, urlsplit
+
+from django_openid_auth import PY3
+from django_openid_auth.store import import_string
+
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class HostPool(object):
+    """The connections to a single host, at most max_connections of which
+    may be in use at once."""
+
+    def __init__(self, connection_class, host, port, max_connections,
+                 timeout, idle_timeout):
+        self.connection_class = connection_class
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.semaphore = threading.BoundedSemaphore(max_connections)
+        self.lock = threading.Lock()
+        # (connection, time it was released) pairs, most recent last.
+        self.idle = []
+        # The number of requests using the pool, guarded by the lock of
+        # the fetcher that owns it.
+        self.users = 0
+
+    def acquire(self):
+        """Return a connection and whether it was used before."""
+        if PY3:
+            acquired = self.semaphore.acquire(timeout=self.timeout)
+        else:
+            acquired = self.semaphore.acquire()
+        if not acquired:
+            raise HTTPFetchingError(
+                'Timed out waiting for a connection to %s' % self.host)
+
+        now = time.time()
+        with self.lock:
+            while self.idle:
+                connection, released = self.idle.pop()
+                if now - released < self.idle_timeout:
+                    return connection, True
+                connection.close()
+        return self.new_connection(), False
+
+    def new_connection(self):
+        return self.connection_class(
+            self.host, self.port, timeout=self.timeout)
+
+    def release(self, connection, reuse=True):
+        if reuse:
+            with self.lock:
+                self.idle.append((connection, time.time()))
+        else:
+            connection.close()
+        self.semaphore.release()
+
+    def reap(self, now):
+        """Close the connections that have been idle for too long."""
+        with self.lock:
+            expired = [
+                connection for connection, released in self.idle
+                if now - released >= self.idle_timeout]
+            self.idle = [
+                (connection, released) for connection, released in self.idle
+                if now - released < self.idle_timeout]
+        for connection in expired:
+            connection.close()
+
+    def close(self):
+        with self.lock:
+            for connection, released in self.idle:
+                connection.close()
+            del self.idle[:]
+
+
+class PooledHTTPFetcher(HTTPFetcher):
+    """Fetcher that reuses keep-alive connections to each host.
+
+    Requests time out after timeout seconds, which also bounds the wait
+    for a free connection when max_connections to a host are in use.
+    Idle connections are closed once they have been unused for
+    idle_timeout seconds, which is checked on every fetch.  At most
+    max_pools hosts have connections kept for them; beyond that the
+    least recently used hosts that no request is using are dropped.
+    """
+
+    def __init__(self, timeout=10, max_connections=10, idle_timeout=30,
+                 max_redirects=5, max_pools=100):
+        super(PooledHTTPFetcher, self).__init__()
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.max_redirects = max_redirects
+        self.max_pools = max_pools
+        # Pools by (scheme, host, port), least recently used first.
+        self.pools = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_pool(self, scheme, host, port):
+        """Return the pool for a host, which is kept until put_pool() is
+        called for it."""
+        key = (scheme, host, port)
+        with self.lock:
+            pool = self.pools.pop(key, None)
+            if pool is None:
+                if scheme == 'https':
+                    connection_class = http_client.HTTPSConnection
+                else:
+                    connection_class = http_client.HTTPConnection
+                pool = HostPool(
+                    connection_class, host, port, self.max_connections,
+                    self.timeout, self.idle_timeout)
+            self.pools[key] = pool
+            pool.users += 1
+            evicted = self.evict_pools()
+        for evicted_pool in evicted:
+            evicted_pool.close()
+        return pool
+
+    def put_pool(self, pool):
+        with self.lock:
+            pool.users -= 1
+
+    def evict_pools(self):
+        """Remove the least recently used pools that nothing is using
+        until there are at most max_pools, returning the removed pools.
+
+        Must be called with the lock held.
+        """
+        excess = len(self.pools) - self.max_pools
+        evicted = []
+        for key, pool in list(self.pools.items()):
+            if excess <= 0:
+                break
+            if not pool.users:
+                del self.pools[key]
+                evicted.append(pool)
+                excess -= 1
+        return evicted
+
+    def reap(self):
+        """Close the expired idle connections to every host."""
+        with self.lock:
+            pools = list(self.pools.values())
+        now = time.time()
+        for pool in pools:
+            pool.reap(now)
+
+    def close(self):
+        """Close all idle connections."""
+        with self.lock:
+            pools = list(self.pools.values())
+        for pool in pools:
+            pool.close()
+
+    def fetch(self, url, body=None, headers=None):
+        self.reap()
+        headers = dict(headers or {})
+        headers.setdefault('User-Agent', USER_AGENT)
+        method = 'GET'
+        if body is not None:
+            method = 'POST'
+            headers.setdefault(
+                'Content-Type', 'application/x-www-form-urlencoded')
+            if not isinstance(body, bytes):
+                body = body.encode('utf-8')
+
+        for redirect in range(self.max_redirects + 1):
+            status, response_headers, response_body = self.request(
+                method, url, body, headers)
+            location = response_headers.get('location')
+            if status not in REDIRECT_STATUSES or not location:
+                return HTTPResponse(
+                    url, status, response_headers,
+                    self.decode_body(response_headers, response_body))
+            url = urljoin(url, location)
+            # Like urllib, only 307 and 308 redirects repeat a POST.
+            if status not in (307, 308):
+                method, body = 'GET', None
+                headers.pop('Content-Type', None)
+        raise HTTPFetchingError('Too many redirects fetching %s' % url)
+
+    def request(self, method, url, body, headers):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError('Bad URL scheme: %r' % (url,))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        pool = self.get_pool(parts.scheme, parts.hostname, parts.port)
+        try:
+            response, response_body = self.request_with_pool(
+                pool, method, url, path, body, headers)
+        finally:
+            self.put_pool(pool)
+
+        response_headers = dict(
+            (key.lower(), value) for key, value in response.getheaders())
+        return response.status, response_headers, response_body
+
+    def request_with_pool(self, pool, method, url, path, body, headers):
+        connection, reused = pool.acquire()
+        reuse = False
+        try:
+            try:
+                response = self.send(connection, method, path, body, headers)
+            except (socket.error, http_client.HTTPException):
+                if not reused:
+                    raise
+                # The server closed the idle connection; no request got
+                # through on it, so it is safe to retry on a new one.
+                connection.close()
+                connection = pool.new_connection()
+                response = self.send(connection, method, path, body, headers)
+            response_body, complete = self.read_body(response)
+            reuse = complete and not response.will_close
+        except (socket.error, http_client.HTTPException) as exc:
+            raise HTTPFetchingError('Error fetching %s: %r' % (url, exc))
+        finally:
+            pool.release(connection, reuse=reuse)
+        return response, response_body
+
+    def send(self, connection, method, path, body, headers):
+        connection.request(method, path, body, headers)
+        return connection.getresponse()
+
+    def read_body(self, response):
+        """Read at most MAX_RESPONSE_KB of the body, returning it and
+        whether the whole body was read."""
+        limit = MAX_RESPONSE_KB * 1024
+        chunks, size = [], 0
+        while size <= limit:
+            chunk = response.read(min(65536, limit + 1 - size))
+            if not chunk:
+                return b''.join(chunks), True
+            chunks.append(chunk)
+            size += len(chunk)
+        return b''.join(chunks)[:limit], False
+
+    def decode_body(self, headers, body):
+        # Decode like python-openid's own fetcher does on Python 3.
+        if not PY3:
+            return body
+        content_type = headers.get('content-type', '')
+        charset = 'latin1'
+        for param in content_type.split(';')[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'charset' and value.strip():
+                charset = value.strip().strip('"')
+        try:
+            return body.decode(charset)
+        except (LookupError, UnicodeDecodeError):
+            return body
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """Return the shared instance of the fetcher set in
+    OPENID_FETCHER_CLASS, or None to use python-openid's default."""
+    global _fetcher
+    fetcher_class = getattr(settings, 'OPENID_FETCHER_CLASS', None)
+    if fetcher_class is None:
+        return None
+    with _fetcher_lock:
+        if _fetcher is None:
+            if isinstance(fetcher_class, string_types):
+                try:
+                    fetcher_class = import_string(fetcher_class)
+                except ImportError:
+                    raise ImproperlyConfigured(
+                        "OPENID_FETCHER_CLASS refers to '%s' which could "
+                        "not be imported" % fetcher_class)
+            options = getattr(settings, 'OPENID_FETCHER_OPTIONS', {})
+            _fetcher = fetcher_class(**options)
+        return _fetcher
+
+
+def is_installed(fetcher):
+    """Return whether fetcher is python-openid's default fetcher.
+
+    The default fetcher may be wrapped, by python-openid to turn errors
+    into HTTPFetchingError or by discovery to record headers.
+    """
+    current = getDefaultFetcher()
+    while current is not None:
+        if current is fetcher:
+            return True
+        current = getattr(current, 'fetcher', None)
+    return False
+
+
+def install_fetcher():
+    """Make the configured fetcher python-openid's default fetcher."""
+    fetcher = get_fetcher()
+    if fetcher is not None and not is_installed(fetcher):
+        # python-openid only handles HTTPFetchingError, so let it wrap
+        # anything else, such as a ValueError for a bad URL scheme.
+        setDefaultFetcher(fetcher, wrap_exceptions=True)
+
+
+@receiver(setting_changed)
+def reset_fetcher(sender, setting, **kwargs):
+    global _fetcher
+    if setting in ('OPENID_FETCHER_CLASS', 'OPENID_FETCHER_OPTIONS'):
+        with _fetcher_lock:
+            if _fetcher is not None:
+                if is_installed(_fetcher):
+                    setDefaultFetcher(None)
+                if hasattr(_fetcher, 'close'):
+                    _fetcher.close()
+            _fetcher = None
@@ -0,0 +1,168 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Timing of the phases of an OpenID login.
+
+The login views and the authentication backend wrap each phase of a login
+in login_phase(), which sends the openid_login_phase signal with the
+phase's duration in seconds and the number of queries it ran on the
+default database.  Nothing is measured unless a receiver is connected.
+
+Two ready-made receivers are provided: log_login_phase(), which logs each
+phase, and PhaseHistogram, which aggregates durations into buckets that
+can be exported to a metrics system.
+"""
+
+from __future__ import division, unicode_literals
+
+import logging
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from django.db import connection
+
+from django_openid_auth.models import UserOpenID
+from django_openid_auth.signals import openid_login_phase
+
+
+logger = logging.getLogger(__name__)
+
+# The phases of login_complete, in the order in which they run.
+PARSE_OPENID_RESPONSE = 'parse_openid_response'
+AUTHENTICATE = 'authenticate'
+UPDATE_USER_DETAILS = 'update_user_details'
+UPDATE_GROUPS = 'update_groups'
+AUTH_LOGIN = 'auth_login'
+
+
+class QueryCounter(object):
+    """Database execute wrapper that counts the queries run through it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def login_phase(phase, request=None):
+    """Time a phase of the login and report it with openid_login_phase.
+
+    Query counts need Django 2.0's execute wrappers; on older versions
+    they are reported as None.
+    """
+    if not openid_login_phase.has_listeners(UserOpenID):
+        yield
+        return
+
+    counter = None
+    if hasattr(connection, 'execute_wrapper'):
+        counter = QueryCounter()
+    start = default_timer()
+    try:
+        if counter is None:
+            yield
+        else:
+            with connection.execute_wrapper(counter):
+                yield
+    finally:
+        # Phases that fail are reported too, as they are often the slow
+        # ones.
+        duration = default_timer() - start
+        openid_login_phase.send(
+            sender=UserOpenID, request=request, phase=phase,
+            duration=duration,
+            queries=counter.count if counter is not None else None)
+
+
+def log_login_phase(sender, phase, duration, queries, **kwargs):
+    """Receiver that logs the duration and query count of each phase."""
+    logger.info(
+        'OpenID login phase %s took %.1fms and %s queries',
+        phase, duration * 1000, queries)
+
+
+class PhaseHistogram(object):
+    """Receiver that aggregates phase durations into histogram buckets.
+
+    Each bucket counts the phases that took at most that many seconds, as
+    in a Prometheus histogram; durations above the last bound are only
+    reflected in the count.  Connect an instance to openid_login_phase
+    and read snapshot() periodically to export the figures.
+    """
+
+    DEFAULT_BUCKETS = (
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.phases = OrderedDict()
+
+    def __call__(self, sender, phase, duration, queries, **kwargs):
+        with self.lock:
+            stats = self.phases.get(phase)
+            if stats is None:
+                stats = self.phases[phase] = {
+                    'count': 0,
+                    'sum': 0.0,
+                    'queries': 0,
+                    'buckets': [0] * len(self.buckets),
+                }
+            stats['count'] += 1
+            stats['sum'] += duration
+            stats['queries'] += queries or 0
+            index = bisect_left(self.buckets, duration)
+            if index < len(self.buckets):
+                stats['buckets'][index] += 1
+
+    def snapshot(self):
+        """Return the cumulative histogram for each phase seen so far."""
+        with self.lock:
+            result = OrderedDict()
+            for phase, stats in self.phases.items():
+                cumulative, buckets = 0, []
+                for bound, count in zip(self.buckets, stats['buckets']):
+                    cumulative += count
+                    buckets.append((bound, cumulative))
+                result[phase] = {
+                    'count': stats['count'],
+                    'sum': stats['sum'],
+                    'queries': stats['queries'],
+                    'buckets': buckets,
+                }
+            return result
@@ -26,16 +26,114 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-from __future__ import unicode_literals
+from __future__ import division, unicode_literals
 
-from django.core.management.base import NoArgsCommand
+import time
 
-from django_openid_auth.store import DjangoOpenIDStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
 
+from django_openid_auth.store import DjangoOpenIDStore, get_store
 
-class Command(NoArgsCommand):
+
+class Command(BaseCommand):
     help = 'Clean up stale OpenID associations and nonces'
 
-    def handle_noargs(self, **options):
-        store = DjangoOpenIDStore()
-        store.cleanup()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Delete at most this many rows per statement.')
+        parser.add_argument(
+            '--pause', type=float, default=None,
+            help='Seconds to sleep between batches.')
+        parser.add_argument(
+            '--nonces-only', action='store_true', default=False,
+            help='Only clean up nonces.')
+        parser.add_argument(
+            '--associations-only', action='store_true', default=False,
+            help='Only clean up associations.')
+        parser.add_argument(
+            '--dry-run', action='store_true', default=False,
+            help='Report how many rows would be deleted without deleting.')
+        parser.add_argument(
+            '--loop-interval', type=float, default=None,
+            help='Keep running, cleaning up every this many seconds.')
+
+    def handle(self, **options):
+        if options['nonces_only'] and options['associations_only']:
+            raise CommandError(
+                '--nonces-only and --associations-only are mutually '
+                'exclusive')
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        # Stores that do not keep anything in the database need no
+        # cleanup, but may have left rows behind from before they were
+        # configured.
+        store = get_store()
+        if not isinstance(store, DjangoOpenIDStore):
+            store = DjangoOpenIDStore()
+        loop_interval = options['loop_interval']
+        try:
+            while True:
+                if loop_interval:
+                    # The loop can outlive the database connection, if
+                    # the server closes it after being idle for a while.
+                    close_old_connections()
+                try:
+                    self.cleanup(store, **options)
+                except Exception as e:
+                    if not loop_interval:
+                        raise
+                    self.stderr.write('Cleanup failed: %s' % e)
+                if not loop_interval:
+                    break
+                time.sleep(loop_interval)
+        except KeyboardInterrupt:
+            pass
+
+    def cleanup(self, store, **options):
+        create_buckets = getattr(store, 'createBuckets', None)
+        if create_buckets is not None and not (
+                options['associations_only'] or options['dry_run']):
+            # Create the nonce tables logins are about to need, so that
+            # they don't have to.
+            create_buckets()
+        if not options['associations_only']:
+            self.cleanup_kind(
+                'nonces', store.countExpiredNonces, store.cleanupNonces,
+                store.cleanupNoncesInBatches, **options)
+        if not options['nonces_only']:
+            self.cleanup_kind(
+                'associations', store.countExpiredAssociations,
+                store.cleanupAssociations, store.cleanupAssociationsInBatches,
+                **options)
+
+    def cleanup_kind(self, kind, count_expired, cleanup, cleanup_in_batches,
+                     **options):
+        verbosity = options.get('verbosity', 1)
+        started = time.time()
+        if options['dry_run']:
+            count = count_expired()
+            self.stdout.write('Would delete %d %s' % (count, kind))
+            return count
+
+        batch_size = options['batch_size']
+        if batch_size:
+            pause = options['pause'] or 0
+            count = 0
+            for batch in cleanup_in_batches(batch_size, pause):
+                count += batch.deleted
+                if verbosity >= 2:
+                    self.stdout.write('Deleted batch of %d %s in %.3fs' % (
+                        batch.deleted, kind, batch.elapsed))
+        else:
+            count = cleanup(pause=options['pause'])
+
+        elapsed = time.time() - started
+        if verbosity >= 1:
+            rate = count / elapsed if elapsed else 0
+            self.stdout.write(
+                'Deleted %d %s in %.3fs (%.1f rows/s)' % (
+                    count, kind, elapsed, rate))
+        return count
@@ -0,0 +1,105 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import unicode_literals
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from django_openid_auth.associations import (
+    RenewalResult,
+    get_renewal_identifiers,
+    renew_associations,
+)
+
+
+class Command(BaseCommand):
+    help = ('Establish fresh OpenID associations with providers before the '
+            'current ones expire')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'identifiers', nargs='*',
+            help='Provider identifiers to renew associations with. '
+                 'Defaults to OPENID_SSO_SERVER_URL.')
+        parser.add_argument(
+            '--renew-before', type=int, default=None,
+            help='Renew associations expiring within this many seconds.')
+        parser.add_argument(
+            '--loop-interval', type=float, default=None,
+            help='Keep running, checking every this many seconds.')
+
+    def handle(self, **options):
+        identifiers = options['identifiers'] or get_renewal_identifiers()
+        if not identifiers:
+            raise CommandError(
+                'No providers given and OPENID_SSO_SERVER_URL is not set')
+        if options['renew_before'] is not None and options['renew_before'] < 0:
+            raise CommandError('--renew-before must not be negative')
+
+        loop_interval = options['loop_interval']
+        try:
+            while True:
+                if loop_interval:
+                    # The loop can outlive the database connection, if
+                    # the server closes it after being idle for a while.
+                    close_old_connections()
+                try:
+                    failed = self.renew(
+                        identifiers, options['renew_before'],
+                        options.get('verbosity', 1))
+                except Exception as e:
+                    if not loop_interval:
+                        raise
+                    self.stderr.write('Renewal failed: %s' % e)
+                if not loop_interval:
+                    break
+                time.sleep(loop_interval)
+        except KeyboardInterrupt:
+            return
+        if failed:
+            raise CommandError(
+                'Could not renew associations with %d provider(s)' % failed)
+
+    def renew(self, identifiers, renew_before, verbosity):
+        failed = 0
+        for identifier, result in renew_associations(
+                identifiers, renew_before=renew_before):
+            if not isinstance(result, RenewalResult):
+                failed += 1
+                self.stderr.write(result.message)
+            elif verbosity >= 1:
+                if result.renewed:
+                    message = 'Renewed association with %s (expires in %ds)'
+                else:
+                    message = 'Association with %s is valid for %ds'
+                self.stdout.write(
+                    message % (result.server_url, result.expires_in))
+        return failed
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from django_openid_auth.schema import (
+    PREFIX_LENGTH, AlterPrefixUniqueTogether, is_mysql)
+
+
+def remove_duplicate_nonces(apps, schema_editor):
+    """Drop duplicate nonces so the unique constraint can be added."""
+    Nonce = apps.get_model('django_openid_auth', 'Nonce')
+    # MySQL only enforces uniqueness on the start of the URL.
+    url_length = PREFIX_LENGTH if is_mysql(schema_editor) else None
+    seen = set()
+    duplicates = []
+    nonces = Nonce.objects.order_by('pk').values_list(
+        'pk', 'server_url', 'timestamp', 'salt')
+    for pk, server_url, timestamp, salt in nonces.iterator():
+        key = (server_url[:url_length], timestamp, salt)
+        if key in seen:
+            duplicates.append(pk)
+        else:
+            seen.add(key)
+    if duplicates:
+        Nonce.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openid_auth', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_nonces, migrations.RunPython.noop),
+        AlterPrefixUniqueTogether(
+            name='nonce',
+            unique_together=set([('server_url', 'timestamp', 'salt')]),
+        ),
+    ]
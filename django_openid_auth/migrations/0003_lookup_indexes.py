@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from django_openid_auth.schema import AddPrefixIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openid_auth', '0002_nonce_unique_together'),
+    ]
+
+    operations = [
+        AddPrefixIndex(
+            model_name='association',
+            index=models.Index(
+                fields=['server_url', 'handle'],
+                name='openid_assoc_url_handle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nonce',
+            index=models.Index(
+                fields=['timestamp'], name='openid_nonce_timestamp_idx'),
+        ),
+        AddPrefixIndex(
+            model_name='useropenid',
+            index=models.Index(
+                fields=['claimed_id'], name='openid_claimed_id_idx'),
+        ),
+    ]
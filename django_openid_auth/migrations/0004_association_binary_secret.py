@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import base64
+import binascii
+
+from django.db import migrations, models
+
+
+def decode_secret(text):
+    """Return the raw bytes of a secret stored by the old text field.
+
+    Python 2 stored the base64 string itself, while Python 3 ended up
+    storing the repr of the base64 bytes, e.g. "b'c2VjcmV0'".
+    """
+    text = text.strip()
+    if text[:2] in ('b"', "b'") and text[-1:] == text[1]:
+        text = text[2:-1]
+    try:
+        return base64.b64decode(text.replace('\\n', ''))
+    except (binascii.Error, TypeError, ValueError):
+        return None
+
+
+def secrets_to_binary(apps, schema_editor):
+    Association = apps.get_model('django_openid_auth', 'Association')
+    undecodable = []
+    for assoc in Association.objects.only('id', 'secret').iterator():
+        raw_secret = decode_secret(assoc.secret)
+        if raw_secret is None:
+            undecodable.append(assoc.id)
+        else:
+            Association.objects.filter(id=assoc.id).update(
+                raw_secret=raw_secret)
+    # Associations are renegotiated on demand, so there is no harm in
+    # dropping any that cannot be read.
+    Association.objects.filter(id__in=undecodable).delete()
+
+
+def secrets_to_text(apps, schema_editor):
+    Association = apps.get_model('django_openid_auth', 'Association')
+    for assoc in Association.objects.only('id', 'raw_secret').iterator():
+        Association.objects.filter(id=assoc.id).update(
+            secret=base64.b64encode(bytes(assoc.raw_secret)).decode('ascii'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openid_auth', '0003_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='association',
+            name='raw_secret',
+            field=models.BinaryField(max_length=255, null=True),
+        ),
+        # Lets the text column be added back empty when migrating
+        # backwards, before secrets_to_text() fills it in.
+        migrations.AlterField(
+            model_name='association',
+            name='secret',
+            field=models.TextField(max_length=255, null=True),
+        ),
+        migrations.RunPython(secrets_to_binary, secrets_to_text),
+        migrations.RemoveField(
+            model_name='association',
+            name='secret',
+        ),
+        migrations.RenameField(
+            model_name='association',
+            old_name='raw_secret',
+            new_name='secret',
+        ),
+        migrations.AlterField(
+            model_name='association',
+            name='secret',
+            field=models.BinaryField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='association',
+            name='server_url',
+            field=models.CharField(max_length=2047),
+        ),
+        migrations.AlterField(
+            model_name='association',
+            name='assoc_type',
+            field=models.CharField(max_length=64),
+        ),
+    ]
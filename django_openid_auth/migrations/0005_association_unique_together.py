@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from django_openid_auth.schema import (
+    PREFIX_LENGTH, AlterPrefixUniqueTogether, RemovePrefixIndex, is_mysql)
+
+
+def remove_duplicate_associations(apps, schema_editor):
+    """Keep only the newest association for each (server_url, handle)."""
+    Association = apps.get_model('django_openid_auth', 'Association')
+    # MySQL only enforces uniqueness on the start of the URL.
+    url_length = PREFIX_LENGTH if is_mysql(schema_editor) else None
+    seen = set()
+    duplicates = []
+    associations = Association.objects.order_by(
+        '-issued', '-pk').values_list('pk', 'server_url', 'handle')
+    for pk, server_url, handle in associations.iterator():
+        key = (server_url[:url_length], handle)
+        if key in seen:
+            duplicates.append(pk)
+        else:
+            seen.add(key)
+    if duplicates:
+        Association.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openid_auth', '0004_association_binary_secret'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_associations, migrations.RunPython.noop),
+        AlterPrefixUniqueTogether(
+            name='association',
+            unique_together=set([('server_url', 'handle')]),
+        ),
+        # The unique constraint's index covers the same lookups, so the
+        # plain index is only dropped once the constraint exists.
+        RemovePrefixIndex(
+            model_name='association',
+            name='openid_assoc_url_handle_idx',
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.db import migrations, models
+
+from django_openid_auth.schema import AlterPrefixUniqueTogether
+
+
+def hash_server_urls(apps, schema_editor):
+    Association = apps.get_model('django_openid_auth', 'Association')
+    associations = Association.objects.only('id', 'server_url')
+    for assoc in associations.iterator():
+        Association.objects.filter(id=assoc.id).update(
+            server_url_hash=hashlib.sha1(
+                assoc.server_url.encode('utf-8')).hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openid_auth', '0005_association_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='association',
+            name='server_url_hash',
+            field=models.CharField(
+                default='', editable=False, max_length=40),
+            preserve_default=False,
+        ),
+        migrations.RunPython(hash_server_urls, migrations.RunPython.noop),
+        # On MySQL the old constraint only covered the first characters
+        # of the URL; it is recreated that way when migrating backwards.
+        AlterPrefixUniqueTogether(
+            name='association',
+            unique_together=set([('server_url_hash', 'handle')]),
+        ),
+    ]
@@ -29,9 +29,12 @@
 
 from __future__ import unicode_literals
 
+import hashlib
+
 from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import Permission
+from django.db.models.signals import post_delete, post_migrate
 
 
 class Nonce(models.Model):
@@ -39,21 +42,77 @@ class Nonce(models.Model):
     timestamp = models.IntegerField()
     salt = models.CharField(max_length=40)
 
+    class Meta:
+        unique_together = (('server_url', 'timestamp', 'salt'),)
+        indexes = [
+            models.Index(
+                fields=['timestamp'], name='openid_nonce_timestamp_idx'),
+        ]
+
     def __unicode__(self):
         return u"Nonce: %s, %s" % (self.server_url, self.salt)
 
 
+def hash_server_url(server_url):
+    """Return the fixed-length digest Association rows are keyed by.
+
+    Unlike the server URL itself, it can be indexed whole on every
+    database, so associations of servers whose URLs only differ after
+    the first few hundred characters are kept apart.
+    """
+    return hashlib.sha1(server_url.encode('utf-8')).hexdigest()
+
+
 class Association(models.Model):
-    server_url = models.TextField(max_length=2047)
+    server_url = models.CharField(max_length=2047)
+    server_url_hash = models.CharField(max_length=40, editable=False)
     handle = models.CharField(max_length=255)
-    secret = models.TextField(max_length=255)  # Stored base64 encoded
+    secret = models.BinaryField(max_length=255)
     issued = models.IntegerField()
     lifetime = models.IntegerField()
-    assoc_type = models.TextField(max_length=64)
+    assoc_type = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = (('server_url_hash', 'handle'),)
 
     def __unicode__(self):
         return u"Association: %s, %s" % (self.server_url, self.handle)
 
+    def save(self, *args, **kwargs):
+        self.server_url_hash = hash_server_url(self.server_url)
+        super(Association, self).save(*args, **kwargs)
+
+
+_account_verified_permission_id = None
+
+
+def get_account_verified_permission_id():
+    """Return the id of the account_verified permission.
+
+    The id is looked up once and then kept for the life of the process,
+    until the permission is deleted or migrations are run.
+    """
+    global _account_verified_permission_id
+    if _account_verified_permission_id is None:
+        _account_verified_permission_id = Permission.objects.values_list(
+            'id', flat=True).get(
+                content_type__app_label='django_openid_auth',
+                codename='account_verified')
+    return _account_verified_permission_id
+
+
+def clear_account_verified_permission_id(**kwargs):
+    global _account_verified_permission_id
+    _account_verified_permission_id = None
+
+
+post_migrate.connect(
+    clear_account_verified_permission_id,
+    dispatch_uid='django_openid_auth.clear_account_verified_permission_id')
+post_delete.connect(
+    clear_account_verified_permission_id, sender=Permission,
+    dispatch_uid='django_openid_auth.clear_account_verified_permission_id')
+
 
 class UserOpenID(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -64,8 +123,11 @@ class UserOpenID(models.Model):
         permissions = (
             ('account_verified', 'The OpenID has been verified'),
         )
+        indexes = [
+            models.Index(fields=['claimed_id'], name='openid_claimed_id_idx'),
+        ]
 
     def delete(self, using=None):
-        permission = Permission.objects.get(codename='account_verified')
-        self.user.user_permissions.remove(permission)
+        self.user.user_permissions.remove(
+            get_account_verified_permission_id())
         super(UserOpenID, self).delete(using)
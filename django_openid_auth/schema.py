@@ -0,0 +1,138 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Migration operations for indexes over the long URL columns.
+
+MySQL cannot index TEXT columns, or VARCHAR columns as long as the 2047
+character URLs stored here, without a prefix length: the key would be
+longer than InnoDB allows.  These operations index only the first
+PREFIX_LENGTH characters of such columns on MySQL, and behave like the
+Django operations they extend on other databases.
+"""
+
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+PREFIX_LENGTH = 255
+
+
+def is_mysql(schema_editor):
+    return schema_editor.connection.vendor == 'mysql'
+
+
+def index_columns(schema_editor, model, field_names):
+    """Return the SQL for the indexed columns, with prefix lengths on
+    those too long to index whole."""
+    columns = []
+    for field_name in field_names:
+        field = model._meta.get_field(field_name)
+        column = schema_editor.quote_name(field.column)
+        if (field.get_internal_type() in ('CharField', 'TextField') and
+                (field.max_length is None or
+                 field.max_length > PREFIX_LENGTH)):
+            column = '%s(%d)' % (column, PREFIX_LENGTH)
+        columns.append(column)
+    return ', '.join(columns)
+
+
+def create_prefix_index(schema_editor, model, name, field_names,
+                        unique=False):
+    schema_editor.execute('CREATE %sINDEX %s ON %s (%s)' % (
+        'UNIQUE ' if unique else '',
+        schema_editor.quote_name(name),
+        schema_editor.quote_name(model._meta.db_table),
+        index_columns(schema_editor, model, field_names)))
+
+
+class AddPrefixIndex(migrations.AddIndex):
+    """Add an index, using column prefixes on MySQL."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if not is_mysql(schema_editor):
+            return super(AddPrefixIndex, self).database_forwards(
+                app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        create_prefix_index(
+            schema_editor, model, self.index.name, self.index.fields)
+
+
+class RemovePrefixIndex(migrations.RemoveIndex):
+    """Remove an index, recreating it with column prefixes on MySQL when
+    migrating backwards."""
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if not is_mysql(schema_editor):
+            return super(RemovePrefixIndex, self).database_backwards(
+                app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        model_state = to_state.models[app_label, self.model_name_lower]
+        index = model_state.get_index_by_name(self.name)
+        create_prefix_index(schema_editor, model, index.name, index.fields)
+
+
+class AlterPrefixUniqueTogether(migrations.AlterUniqueTogether):
+    """Change unique_together, using column prefixes on MySQL.
+
+    On MySQL only the first PREFIX_LENGTH characters of long columns
+    take part in the constraint.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if not is_mysql(schema_editor):
+            return super(AlterPrefixUniqueTogether, self).database_forwards(
+                app_label, schema_editor, from_state, to_state)
+        new_model = to_state.apps.get_model(app_label, self.name)
+        if not self.allow_migrate_model(
+                schema_editor.connection.alias, new_model):
+            return
+        old_model = from_state.apps.get_model(app_label, self.name)
+        old_value = set(
+            tuple(fields) for fields in old_model._meta.unique_together)
+        new_value = set(
+            tuple(fields) for fields in new_model._meta.unique_together)
+        for fields in old_value - new_value:
+            schema_editor._delete_composed_index(
+                old_model, fields, {'unique': True},
+                schema_editor.sql_delete_unique)
+        for fields in new_value - old_value:
+            columns = [
+                new_model._meta.get_field(field).column for field in fields]
+            create_prefix_index(
+                schema_editor, new_model,
+                schema_editor._create_index_name(
+                    new_model._meta.db_table, columns, suffix='_uniq'),
+                fields, unique=True)
@@ -0,0 +1,156 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""JSON-serializable storage for python-openid's consumer state.
+
+python-openid keeps an OpenIDServiceEndpoint for the request in progress,
+and a YadisServiceManager with the services left to try, in the session it
+is given.  ConsumerSession stores them as plain dicts holding just the
+endpoint attributes complete() needs, so that the session can use the
+JSON serializer and stays small.
+"""
+
+from __future__ import unicode_literals
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+from openid.consumer.discover import OpenIDServiceEndpoint
+from openid.yadis.manager import YadisServiceManager
+
+
+ENDPOINT_ATTRIBUTES = (
+    'claimed_id',
+    'server_url',
+    'type_uris',
+    'local_id',
+    'canonicalID',
+    'display_identifier',
+    'used_yadis',
+)
+
+
+def encode_endpoint(endpoint):
+    # Attributes left at their defaults are not stored.
+    return dict(
+        (name, getattr(endpoint, name)) for name in ENDPOINT_ATTRIBUTES
+        if getattr(endpoint, name))
+
+
+def decode_endpoint(data):
+    endpoint = OpenIDServiceEndpoint()
+    for name, value in data.items():
+        setattr(endpoint, name, value)
+    return endpoint
+
+
+def encode_manager(manager):
+    data = {
+        'starting_url': manager.starting_url,
+        'yadis_url': manager.yadis_url,
+        'services': [encode_endpoint(service) for service in manager.services],
+        'session_key': manager.session_key,
+    }
+    if manager.current() is not None:
+        data['current'] = encode_endpoint(manager.current())
+    return data
+
+
+def decode_manager(data):
+    manager = YadisServiceManager(
+        data['starting_url'], data['yadis_url'],
+        [decode_endpoint(service) for service in data['services']],
+        data['session_key'])
+    if 'current' in data:
+        manager._current = decode_endpoint(data['current'])
+    return manager
+
+
+def encode(value):
+    if isinstance(value, OpenIDServiceEndpoint):
+        return {'endpoint': encode_endpoint(value)}
+    if isinstance(value, YadisServiceManager):
+        return {'services': encode_manager(value)}
+    return value
+
+
+def decode(value):
+    if isinstance(value, dict) and len(value) == 1:
+        if 'endpoint' in value:
+            return decode_endpoint(value['endpoint'])
+        if 'services' in value:
+            return decode_manager(value['services'])
+    # Anything else, including objects pickled into sessions before
+    # this was used, is returned as it is.
+    return value
+
+
+class ConsumerSession(MutableMapping):
+    """The part of a Django session given to python-openid's Consumer.
+
+    Values are kept under session_key in the Django session, with the
+    endpoint and service manager objects python-openid saves converted
+    to and from plain dicts.
+    """
+
+    def __init__(self, session, session_key='OPENID'):
+        self.session = session
+        self.session_key = session_key
+
+    def _data(self):
+        return self.session.get(self.session_key, {})
+
+    def _save(self, data):
+        # Assigning the whole dict again marks the Django session as
+        # modified, which changing it in place would not.
+        if data:
+            self.session[self.session_key] = data
+        elif self.session_key in self.session:
+            del self.session[self.session_key]
+
+    def __getitem__(self, key):
+        return decode(self._data()[key])
+
+    def __setitem__(self, key, value):
+        data = dict(self._data())
+        data[key] = encode(value)
+        self._save(data)
+
+    def __delitem__(self, key):
+        data = dict(self._data())
+        del data[key]
+        self._save(data)
+
+    def __iter__(self):
+        return iter(list(self._data()))
+
+    def __len__(self):
+        return len(self._data())
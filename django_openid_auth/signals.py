@@ -35,3 +35,5 @@ import django.dispatch
 openid_login_complete = django.dispatch.Signal(providing_args=[
     'request', 'openid_response'])
 openid_duplicate_username = django.dispatch.Signal(providing_args=['username'])
+openid_login_phase = django.dispatch.Signal(providing_args=[
+    'request', 'phase', 'duration', 'queries'])
@@ -29,15 +29,248 @@
 
 from __future__ import unicode_literals
 
-import base64
+import hashlib
+import threading
 import time
+from collections import OrderedDict, namedtuple
 
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    ProgrammingError,
+    connections,
+    router,
+    transaction,
+)
+from django.db.models import F
 from openid.association import Association as OIDAssociation
 from openid.store.interface import OpenIDStore
 from openid.store.nonce import SKEW
+from six import string_types
 
-from django_openid_auth import PY3
-from django_openid_auth.models import Association, Nonce
+from django_openid_auth.models import Association, Nonce, hash_server_url
+
+try:
+    from django.utils.module_loading import import_string
+except ImportError:
+    # SHIM: Django 1.6 only provides import_by_path.
+    from django.utils.module_loading import import_by_path as import_string
+
+
+class AssociationCache(object):
+    """A bounded, in-process LRU cache of decoded associations.
+
+    Entries are keyed by (server_url, handle) and expire when the
+    association itself does, at issued + lifetime.  The newest
+    association for a server, cached under (server_url, None), is also
+    kept for at most OPENID_ASSOCIATION_RENEW_BEFORE seconds so that
+    associations renewed by other processes are picked up before the
+    old one expires.  The cache size is read from the
+    OPENID_ASSOCIATION_CACHE_SIZE setting unless given explicitly; a
+    size of 0 (the default) disables caching.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'OPENID_ASSOCIATION_CACHE_SIZE', 0)
+
+    def get(self, server_url, handle):
+        key = (server_url, handle)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, association = entry
+            if expires <= time.time():
+                return None
+            # Re-insert to mark the entry as most recently used.
+            self._entries[key] = entry
+            return association
+
+    def set(self, server_url, handle, association):
+        max_size = self.max_size
+        if max_size <= 0:
+            return
+        expires = association.issued + association.lifetime
+        if handle is None:
+            from django_openid_auth.associations import get_renew_before
+            expires = min(expires, time.time() + get_renew_before())
+        with self._lock:
+            self._entries.pop((server_url, handle), None)
+            self._entries[(server_url, handle)] = (expires, association)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, server_url, handle):
+        # The "newest association" entry for the server may also refer
+        # to this handle, so drop it as well.
+        with self._lock:
+            self._entries.pop((server_url, handle), None)
+            self._entries.pop((server_url, None), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+association_cache = AssociationCache()
+
+
+class RecentNonceCache(object):
+    """A bounded, in-process record of the nonces used recently.
+
+    A nonce is remembered for as long as it could still be accepted,
+    SKEW seconds either side of its timestamp, so that a replayed
+    response reaching the same process is rejected without a query.
+    The store stays responsible for rejecting replays across
+    processes.  The maximum number of nonces kept is read from the
+    OPENID_NONCE_CACHE_SIZE setting unless given explicitly; once it
+    is reached the oldest nonces are forgotten first.  A size of 0
+    (the default) disables the cache.
+
+    hits counts the replays rejected from memory and misses the nonces
+    that had to be checked by the store.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'OPENID_NONCE_CACHE_SIZE', 0)
+
+    def _expire(self, now):
+        # Nonces are added roughly in timestamp order, so expired ones
+        # collect at the front.
+        while self._entries:
+            key = next(iter(self._entries))
+            if self._entries[key] >= now - SKEW:
+                break
+            del self._entries[key]
+
+    def seen(self, server_url, timestamp, salt):
+        """Return whether the nonce has been used by this process."""
+        if self.max_size <= 0:
+            return False
+        with self._lock:
+            if (server_url, timestamp, salt) in self._entries:
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, server_url, timestamp, salt):
+        max_size = self.max_size
+        if max_size <= 0:
+            return
+        with self._lock:
+            self._expire(time.time())
+            self._entries[(server_url, timestamp, salt)] = timestamp
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+nonce_cache = RecentNonceCache()
+
+
+CleanupBatch = namedtuple('CleanupBatch', ['deleted', 'elapsed'])
+
+
+def get_cleanup_batching(batch_size=None, pause=None):
+    """Fill in the cleanup batch size and pause from the settings."""
+    if batch_size is None:
+        batch_size = getattr(settings, 'OPENID_CLEANUP_BATCH_SIZE', None)
+    if pause is None:
+        pause = getattr(settings, 'OPENID_CLEANUP_BATCH_PAUSE', 0)
+    return batch_size, pause
+
+
+def delete_in_batches(queryset, batch_size, pause=0):
+    """Delete the rows matched by queryset in primary key order.
+
+    At most batch_size rows are deleted per statement, sleeping for
+    pause seconds between batches so that other writers can get at the
+    table.  A CleanupBatch with the number of rows deleted and the time
+    taken is yielded after each batch.
+    """
+    model = queryset.model
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        started = time.time()
+        batch = queryset
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        last_pk = pks[-1]
+        deleted, _ = model.objects.filter(pk__in=pks).delete()
+        yield CleanupBatch(deleted=deleted, elapsed=time.time() - started)
+        if len(pks) < batch_size:
+            return
+        if pause:
+            time.sleep(pause)
+
+
+ASSOCIATION_COLUMNS = (
+    'server_url', 'server_url_hash', 'handle', 'secret', 'issued',
+    'lifetime', 'assoc_type')
+ASSOCIATION_UPDATED_COLUMNS = ASSOCIATION_COLUMNS[3:]
+
+
+def upsert_association_sql(connection):
+    """Return a single statement that inserts an association, or updates
+    the row already stored for its server and handle.
+
+    Returns None for databases that cannot do that in one statement.
+    The Django versions supported here have no upsert of their own.
+    """
+    quote_name = connection.ops.quote_name
+    if connection.vendor == 'mysql':
+        conflict = 'ON DUPLICATE KEY UPDATE %s' % ', '.join(
+            '%s = VALUES(%s)' % (quote_name(column), quote_name(column))
+            for column in ASSOCIATION_UPDATED_COLUMNS)
+    elif connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite' and
+            connection.Database.sqlite_version_info >= (3, 24, 0)):
+        conflict = 'ON CONFLICT (%s, %s) DO UPDATE SET %s' % (
+            quote_name('server_url_hash'), quote_name('handle'),
+            ', '.join(
+                '%s = EXCLUDED.%s' % (quote_name(column), quote_name(column))
+                for column in ASSOCIATION_UPDATED_COLUMNS))
+    else:
+        return None
+    return 'INSERT INTO %s (%s) VALUES (%s) %s' % (
+        quote_name(Association._meta.db_table),
+        ', '.join(quote_name(column) for column in ASSOCIATION_COLUMNS),
+        ', '.join(['%s'] * len(ASSOCIATION_COLUMNS)),
+        conflict)
 
 
 class DjangoOpenIDStore(OpenIDStore):
@@ -45,87 +278,76 @@ class DjangoOpenIDStore(OpenIDStore):
     def __init__(self):
         super(DjangoOpenIDStore, self).__init__()
         self.max_nonce_age = 6 * 60 * 60  # Six hours
+        self.association_cache = association_cache
+        self.nonce_cache = nonce_cache
 
     def storeAssociation(self, server_url, association):
-        try:
-            assoc = Association.objects.get(
-                server_url=server_url, handle=association.handle)
-            if isinstance(assoc.secret, str) and PY3:
-                try:
-                    assoc.secret = assoc.secret.split("b'")[1].split("'")[0]
-                except Exception:
-                    pass
-                assoc.secret = bytes(assoc.secret, 'utf-8')
-        except Association.DoesNotExist:
-            if isinstance(association.secret, str) and PY3:
-                association.secret = association.secret.split("b'")[1].split("'")[0]
-                association.secret = bytes(association.secret, 'utf-8')
-            assoc = Association(
-                server_url=server_url,
-                handle=association.handle,
-                secret=base64.encodestring(association.secret),
-                issued=association.issued,
-                lifetime=association.lifetime,
-                assoc_type=association.assoc_type)
+        fields = {
+            'secret': association.secret,
+            'issued': association.issued,
+            'lifetime': association.lifetime,
+            'assoc_type': association.assoc_type,
+        }
+        # Rows are unique on the hash of the URL rather than the URL, which
+        # MySQL could only index the start of.
+        server_url_hash = hash_server_url(server_url)
+        using = router.db_for_write(Association)
+        connection = connections[using]
+        sql = upsert_association_sql(connection)
+        if sql is not None:
+            values = dict(
+                fields, server_url=server_url,
+                server_url_hash=server_url_hash, handle=association.handle)
+            params = [
+                Association._meta.get_field(name).get_db_prep_save(
+                    values[name], connection)
+                for name in ASSOCIATION_COLUMNS]
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
         else:
-            if isinstance(assoc.secret, str) and PY3:
-                try:
-                    assoc.secret = assoc.secret.split("b'")[1].split("'")[0]
-                except Exception:
-                    pass
-                assoc.secret = bytes(assoc.secret, 'utf-8')
-            assoc.secret = base64.encodestring(association.secret)
-            assoc.issued = association.issued
-            assoc.lifetime = association.lifetime
-            assoc.assoc_type = association.assoc_type
-        if isinstance(assoc.secret, bytes) and PY3:
-            assoc.secret = bytes(assoc.secret.decode('utf-8').rstrip(), 'utf-8')
-        assoc.save()
+            # SHIM: Databases that cannot upsert rely on the unique
+            # constraint, and update the existing row if the insert
+            # loses out to it.
+            try:
+                with transaction.atomic(using=using):
+                    Association.objects.using(using).create(
+                        server_url=server_url, handle=association.handle,
+                        **fields)
+            except IntegrityError:
+                Association.objects.using(using).filter(
+                    server_url_hash=server_url_hash,
+                    handle=association.handle,
+                ).update(**fields)
+        self.association_cache.invalidate(server_url, association.handle)
 
     def getAssociation(self, server_url, handle=None):
-        assocs = []
+        association = self.association_cache.get(server_url, handle)
+        if association is not None:
+            return association
+
+        # Only ever read here: expired rows are skipped in SQL and left
+        # for cleanupAssociations() to delete.
+        assocs = Association.objects.filter(
+            server_url_hash=hash_server_url(server_url),
+            server_url=server_url,
+            issued__gt=int(time.time()) - F('lifetime'))
         if handle is not None:
-            assocs = Association.objects.filter(
-                server_url=server_url, handle=handle)
-        else:
-            assocs = Association.objects.filter(server_url=server_url)
-        associations = []
-        expired = []
-        for assoc in assocs:
-            if isinstance(assoc.secret, str) and PY3:
-                try:
-                    assoc.secret = assoc.secret.split("b'")[1].split("'")[0]
-                except Exception:
-                    pass
-                assoc.secret = bytes(assoc.secret, 'utf-8')
-            if isinstance(assoc.secret, bytes) and PY3:
-                assoc.secret = bytes(assoc.secret.decode('utf-8').rstrip(), 'utf-8')
-            if PY3:
-                decoded = base64.decodebytes(assoc.secret)
-            else:
-                decoded = base64.decodestring(assoc.secret)
-            association = OIDAssociation(
-                assoc.handle,
-                decoded,
-                assoc.issued, assoc.lifetime, assoc.assoc_type
-            )
-            if PY3:
-                expires_in = association.expiresIn
-            else:
-                expires_in = association.getExpiresIn()
-            if expires_in == 0:
-                expired.append(assoc)
-            else:
-                associations.append((association.issued, association))
-        for assoc in expired:
-            assoc.delete()
-        if not associations:
+            assocs = assocs.filter(handle=handle)
+        assoc = assocs.order_by('-issued', '-id').first()
+        if assoc is None:
             return None
-        associations.sort()
-        return associations[-1][1]
+
+        # Some database drivers hand back a memoryview rather than bytes.
+        association = OIDAssociation(
+            assoc.handle, bytes(assoc.secret),
+            assoc.issued, assoc.lifetime, assoc.assoc_type)
+        self.association_cache.set(server_url, handle, association)
+        return association
 
     def removeAssociation(self, server_url, handle):
+        self.association_cache.invalidate(server_url, handle)
         assocs = list(Association.objects.filter(
+            server_url_hash=hash_server_url(server_url),
             server_url=server_url, handle=handle))
         assocs_exist = len(assocs) > 0
         for assoc in assocs:
@@ -135,36 +357,365 @@ class DjangoOpenIDStore(OpenIDStore):
     def useNonce(self, server_url, timestamp, salt):
         if abs(timestamp - time.time()) > SKEW:
             return False
+        if self.nonce_cache.seen(server_url, timestamp, salt):
+            return False
+
+        used = self._record_nonce(server_url, timestamp, salt)
+        self.nonce_cache.add(server_url, timestamp, salt)
+        return used
 
+    def _record_nonce(self, server_url, timestamp, salt):
+        # Rely on the unique constraint rather than checking first, so
+        # that concurrent uses of the same nonce cannot both succeed.
         try:
-            ononce = Nonce.objects.get(
-                server_url__exact=server_url,
-                timestamp__exact=timestamp,
-                salt__exact=salt)
-        except Nonce.DoesNotExist:
-            ononce = Nonce(
-                server_url=server_url,
-                timestamp=timestamp,
-                salt=salt)
-            ononce.save()
-            return True
-
-        return False
-
-    def cleanupNonces(self, _now=None):
+            with transaction.atomic():
+                Nonce.objects.create(
+                    server_url=server_url,
+                    timestamp=timestamp,
+                    salt=salt)
+        except IntegrityError:
+            return False
+        return True
+
+    def _expired_nonces(self, _now=None):
         if _now is None:
             _now = int(time.time())
-        expired = Nonce.objects.filter(timestamp__lt=_now - SKEW)
+        return Nonce.objects.filter(timestamp__lt=_now - SKEW)
+
+    def _expired_associations(self):
+        now = int(time.time())
+        return Association.objects.extra(
+            where=['issued + lifetime < %d' % now])
+
+    def countExpiredNonces(self, _now=None):
+        return self._expired_nonces(_now).count()
+
+    def countExpiredAssociations(self):
+        return self._expired_associations().count()
+
+    def cleanupNonces(self, _now=None, batch_size=None, pause=None):
+        batch_size, pause = get_cleanup_batching(batch_size, pause)
+        if batch_size:
+            return sum(batch.deleted for batch in delete_in_batches(
+                self._expired_nonces(_now), batch_size, pause))
+        expired = self._expired_nonces(_now)
         count = expired.count()
         if count:
             expired.delete()
         return count
 
-    def cleanupAssociations(self):
-        now = int(time.time())
-        expired = Association.objects.extra(
-            where=['issued + lifetime < %d' % now])
+    def cleanupNoncesInBatches(self, batch_size, pause=0, _now=None):
+        """Delete expired nonces in batches, yielding a CleanupBatch each."""
+        return delete_in_batches(
+            self._expired_nonces(_now), batch_size, pause)
+
+    def cleanupAssociations(self, batch_size=None, pause=None):
+        batch_size, pause = get_cleanup_batching(batch_size, pause)
+        if batch_size:
+            return sum(batch.deleted for batch in delete_in_batches(
+                self._expired_associations(), batch_size, pause))
+        expired = self._expired_associations()
         count = expired.count()
         if count:
             expired.delete()
         return count
+
+    def cleanupAssociationsInBatches(self, batch_size, pause=0):
+        """Delete expired associations in batches, yielding a CleanupBatch
+        each."""
+        return delete_in_batches(
+            self._expired_associations(), batch_size, pause)
+
+
+class BucketedNonceStore(DjangoOpenIDStore):
+    """A database store keeping nonces in one table per SKEW seconds.
+
+    Each nonce is written to the table for the window its timestamp
+    falls in.  createBuckets(), which openid_cleanup calls, creates the
+    tables ahead of time so that logins don't have to; a login only
+    creates its window's table if it is still missing.  Once every nonce
+    in a window has expired, cleanupNonces() drops the whole table
+    instead of deleting its rows one by one, so the nonce tables never
+    need vacuuming.
+    Associations are stored as by DjangoOpenIDStore.
+
+    MySQL is not supported: it cannot index the whole server_url
+    column, and the DDL creating each table would implicitly commit the
+    transaction of the request that needed it.
+    """
+
+    bucket_seconds = SKEW
+    # How many times to try creating a table that other processes may be
+    # creating concurrently.
+    create_attempts = 3
+
+    def __init__(self):
+        super(BucketedNonceStore, self).__init__()
+        if connections[router.db_for_write(Nonce)].vendor == 'mysql':
+            raise ImproperlyConfigured(
+                'BucketedNonceStore does not support MySQL')
+
+    # The (database alias, bucket) pairs known to have a table.
+    _created_buckets = set()
+    _lock = threading.Lock()
+
+    def _bucket(self, timestamp):
+        return int(timestamp) // self.bucket_seconds
+
+    def _bucket_table(self, bucket):
+        return '%s_bucket_%d' % (Nonce._meta.db_table, bucket)
+
+    def _buckets(self, connection):
+        prefix = self._bucket_table(0)[:-1]
+        with connection.cursor() as cursor:
+            tables = connection.introspection.table_names(cursor)
+        return sorted(
+            int(table[len(prefix):]) for table in tables
+            if table.startswith(prefix) and table[len(prefix):].isdigit())
+
+    def _create_bucket(self, connection, bucket):
+        key = (connection.alias, bucket)
+        if key in self._created_buckets:
+            return
+        with self._lock:
+            if key in self._created_buckets:
+                return
+            # Only run DDL for tables that weren't created ahead of time,
+            # as it takes locks that would serialize concurrent logins.
+            existing = self._buckets(connection)
+            self._created_buckets.update(
+                (connection.alias, existing_bucket)
+                for existing_bucket in existing)
+            if bucket not in existing:
+                self._create_bucket_table(connection, bucket)
+            self._created_buckets.add(key)
+
+    def _create_bucket_table(self, connection, bucket):
+        quote_name = connection.ops.quote_name
+        sql = (
+            'CREATE TABLE IF NOT EXISTS %(table)s ('
+            '%(server_url)s varchar(2047) NOT NULL, '
+            '%(timestamp)s integer NOT NULL, '
+            '%(salt)s varchar(40) NOT NULL, '
+            'UNIQUE (%(server_url)s, %(timestamp)s, %(salt)s))' % {
+                'table': quote_name(self._bucket_table(bucket)),
+                'server_url': quote_name('server_url'),
+                'timestamp': quote_name('timestamp'),
+                'salt': quote_name('salt'),
+            })
+        for attempt in range(self.create_attempts):
+            try:
+                with transaction.atomic(using=connection.alias):
+                    with connection.cursor() as cursor:
+                        cursor.execute(sql)
+                return
+            except (IntegrityError, ProgrammingError):
+                # When two processes create the same table at once, one
+                # of them can fail (on PostgreSQL, with a unique
+                # violation in pg_type) once the other commits.  The
+                # savepoint keeps the request's transaction usable, and
+                # the retry finds the table created.
+                if attempt == self.create_attempts - 1:
+                    if bucket not in self._buckets(connection):
+                        raise
+
+    def createBuckets(self, ahead=1, _now=None):
+        """Create the nonce tables for the current window, the windows of
+        nonces timestamped up to SKEW seconds in the future, and ahead
+        windows after those.
+
+        Run this more often than every bucket_seconds, as openid_cleanup
+        --loop-interval can, so that logins never create a table.
+        """
+        if _now is None:
+            _now = int(time.time())
+        connection = connections[router.db_for_write(Nonce)]
+        for bucket in range(
+                self._bucket(_now), self._bucket(_now + SKEW) + ahead + 1):
+            self._create_bucket(connection, bucket)
+
+    def _insert_nonce(self, connection, bucket, server_url, timestamp, salt):
+        quote_name = connection.ops.quote_name
+        sql = 'INSERT INTO %s (%s, %s, %s) VALUES (%%s, %%s, %%s)' % (
+            quote_name(self._bucket_table(bucket)), quote_name('server_url'),
+            quote_name('timestamp'), quote_name('salt'))
+        try:
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [server_url, int(timestamp), salt])
+        except IntegrityError:
+            return False
+        return True
+
+    def _record_nonce(self, server_url, timestamp, salt):
+        connection = connections[router.db_for_write(Nonce)]
+        bucket = self._bucket(timestamp)
+        self._create_bucket(connection, bucket)
+        try:
+            return self._insert_nonce(
+                connection, bucket, server_url, timestamp, salt)
+        except DatabaseError:
+            # The table may have been rolled back or dropped since it
+            # was created, so create it again.
+            self._created_buckets.discard((connection.alias, bucket))
+            self._create_bucket(connection, bucket)
+            return self._insert_nonce(
+                connection, bucket, server_url, timestamp, salt)
+
+    def _expired_buckets(self, connection, _now=None):
+        if _now is None:
+            _now = int(time.time())
+        oldest = self._bucket(_now - SKEW)
+        return [
+            bucket for bucket in self._buckets(connection) if bucket < oldest]
+
+    def _count_bucket(self, connection, bucket):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM %s' % (
+                connection.ops.quote_name(self._bucket_table(bucket)),))
+            return cursor.fetchone()[0]
+
+    def _drop_bucket(self, connection, bucket):
+        started = time.time()
+        deleted = self._count_bucket(connection, bucket)
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS %s' % (
+                connection.ops.quote_name(self._bucket_table(bucket)),))
+        self._created_buckets.discard((connection.alias, bucket))
+        return CleanupBatch(deleted=deleted, elapsed=time.time() - started)
+
+    def countExpiredNonces(self, _now=None):
+        connection = connections[router.db_for_write(Nonce)]
+        return super(BucketedNonceStore, self).countExpiredNonces(_now) + sum(
+            self._count_bucket(connection, bucket)
+            for bucket in self._expired_buckets(connection, _now))
+
+    def cleanupNonces(self, _now=None, batch_size=None, pause=None):
+        # Nonces left in the regular table from before switching to this
+        # store are cleaned up as usual.
+        count = super(BucketedNonceStore, self).cleanupNonces(
+            _now, batch_size, pause)
+        connection = connections[router.db_for_write(Nonce)]
+        for bucket in self._expired_buckets(connection, _now):
+            count += self._drop_bucket(connection, bucket).deleted
+        return count
+
+    def cleanupNoncesInBatches(self, batch_size, pause=0, _now=None):
+        """Drop expired nonce tables, yielding a CleanupBatch for each.
+
+        Nonces in the regular table are deleted in batch_size batches
+        first.
+        """
+        for batch in super(BucketedNonceStore, self).cleanupNoncesInBatches(
+                batch_size, pause, _now):
+            yield batch
+        connection = connections[router.db_for_write(Nonce)]
+        for bucket in self._expired_buckets(connection, _now):
+            yield self._drop_bucket(connection, bucket)
+
+
+class CacheOpenIDStore(OpenIDStore):
+    """An OpenID store kept in one of the caches configured in CACHES.
+
+    Nonces are recorded with an atomic cache.add() and associations are
+    stored under keys that expire along with them, so nothing needs to
+    be cleaned up periodically.  The cache alias is taken from the
+    OPENID_STORE_CACHE_ALIAS setting and defaults to 'default'.
+    """
+
+    key_prefix = 'django_openid_auth'
+
+    def __init__(self, cache_alias=None):
+        super(CacheOpenIDStore, self).__init__()
+        if cache_alias is None:
+            cache_alias = getattr(
+                settings, 'OPENID_STORE_CACHE_ALIAS', 'default')
+        self.cache = caches[cache_alias]
+
+    def _make_key(self, kind, *parts):
+        # Server URLs can be long and contain characters memcached does
+        # not accept in keys, so hash the variable parts.
+        digest = hashlib.sha1(
+            '\n'.join(parts).encode('utf-8')).hexdigest()
+        return '%s:%s:%s' % (self.key_prefix, kind, digest)
+
+    def _association_key(self, server_url, handle=None):
+        if handle is None:
+            return self._make_key('latest-assoc', server_url)
+        return self._make_key('assoc', server_url, handle)
+
+    def storeAssociation(self, server_url, association):
+        expires_in = (
+            association.issued + association.lifetime - int(time.time()))
+        if expires_in <= 0:
+            return
+        serialized = association.serialize()
+        self.cache.set(
+            self._association_key(server_url, association.handle),
+            serialized, expires_in)
+
+        # Keep track of the newest association for handle-less lookups.
+        latest_key = self._association_key(server_url)
+        latest = self.cache.get(latest_key)
+        if (latest is None or
+                OIDAssociation.deserialize(latest).issued <=
+                association.issued):
+            self.cache.set(latest_key, serialized, expires_in)
+
+    def getAssociation(self, server_url, handle=None):
+        serialized = self.cache.get(
+            self._association_key(server_url, handle))
+        if serialized is None:
+            return None
+        association = OIDAssociation.deserialize(serialized)
+        if association.issued + association.lifetime <= int(time.time()):
+            return None
+        return association
+
+    def removeAssociation(self, server_url, handle):
+        key = self._association_key(server_url, handle)
+        serialized = self.cache.get(key)
+        if serialized is None:
+            return False
+        self.cache.delete(key)
+
+        latest_key = self._association_key(server_url)
+        latest = self.cache.get(latest_key)
+        if (latest is not None and
+                OIDAssociation.deserialize(latest).handle == handle):
+            self.cache.delete(latest_key)
+        return True
+
+    def useNonce(self, server_url, timestamp, salt):
+        now = time.time()
+        if abs(timestamp - now) > SKEW:
+            return False
+
+        # The nonce only has to be remembered until it falls outside
+        # the allowed clock skew.
+        timeout = max(int(timestamp + SKEW - now), 1)
+        key = self._make_key('nonce', server_url, str(timestamp), salt)
+        return self.cache.add(key, True, timeout)
+
+    def cleanupNonces(self):
+        # Expired nonces are evicted by the cache itself.
+        return 0
+
+    def cleanupAssociations(self):
+        # Expired associations are evicted by the cache itself.
+        return 0
+
+
+def get_store():
+    """Return an instance of the OpenID store set in OPENID_STORE_CLASS."""
+    store_class = getattr(
+        settings, 'OPENID_STORE_CLASS',
+        'django_openid_auth.store.DjangoOpenIDStore')
+    if isinstance(store_class, string_types):
+        try:
+            store_class = import_string(store_class)
+        except ImportError:
+            raise ImproperlyConfigured(
+                "OPENID_STORE_CLASS refers to '%s' which could not be "
+                "imported" % store_class)
+    return store_class()
@@ -0,0 +1,118 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Mapping of Launchpad teams to Django groups.
+
+With OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO every group not in
+OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO_BLACKLIST is mapped to the team of
+the same name.  That mapping is kept in the cache selected by
+OPENID_TEAMS_MAPPING_CACHE_ALIAS rather than being recomputed from the
+groups table on every login.  Saving or deleting a group changes the
+shared mapping version, which invalidates the cached mapping for every
+process using the same cache.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+
+VERSION_KEY = 'django_openid_auth:teams-mapping:version'
+
+
+def get_cache():
+    alias = getattr(settings, 'OPENID_TEAMS_MAPPING_CACHE_ALIAS', 'default')
+    return caches[alias]
+
+
+def get_mapping_version():
+    """Return the current version of the automatic teams mapping."""
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_teams_mapping():
+    """Discard any cached automatic teams mapping."""
+    get_cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def is_auto_mapping():
+    return getattr(settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO', False)
+
+
+def compute_auto_teams_mapping(blacklist):
+    names = Group.objects.exclude(
+        name__in=blacklist).values_list('name', flat=True)
+    return dict((name, name) for name in names)
+
+
+def get_teams_mapping():
+    """Return the mapping of Launchpad team names to Django group names."""
+    if not is_auto_mapping():
+        return getattr(settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING', {})
+
+    # ignore OPENID_LAUNCHPAD_TEAMS_MAPPING. use all django-groups
+    blacklist = getattr(
+        settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO_BLACKLIST', [])
+    blacklist_hash = hashlib.sha1(
+        '\n'.join(sorted(blacklist)).encode('utf-8')).hexdigest()
+    key = 'django_openid_auth:teams-mapping:%s:%s' % (
+        get_mapping_version(), blacklist_hash)
+    cache = get_cache()
+    teams_mapping = cache.get(key)
+    if teams_mapping is None:
+        teams_mapping = compute_auto_teams_mapping(blacklist)
+        timeout = getattr(
+            settings, 'OPENID_TEAMS_MAPPING_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+        cache.set(key, teams_mapping, timeout)
+    return teams_mapping
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_on_group_changed(sender, **kwargs):
+    invalidate_teams_mapping()
+
+
+@receiver(setting_changed)
+def invalidate_on_setting_changed(sender, setting, **kwargs):
+    if setting.startswith('OPENID_LAUNCHPAD_TEAMS'):
+        invalidate_teams_mapping()
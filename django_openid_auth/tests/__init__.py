@@ -31,3 +31,13 @@ from .test_settings import *
 from .test_store import *
 from .test_auth import *
 from .test_admin import *
+from .test_commands import *
+from .test_discovery import *
+from .test_extensions import *
+from .test_teams_mapping import *
+from .test_instrumentation import *
+from .test_async_views import *
+from .test_fetchers import *
+from .test_associations import *
+from .test_session import *
+from .test_schema import *
@@ -0,0 +1,103 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import unicode_literals
+
+from django.db.models import F
+from django.test import TestCase
+from django.test.utils import override_settings
+from openid.fetchers import setDefaultFetcher
+
+from django_openid_auth.associations import (
+    RenewalResult,
+    renew_association,
+    renew_associations,
+)
+from django_openid_auth.exceptions import AssociationRenewalFailed
+from django_openid_auth.models import Association
+from django_openid_auth.store import DjangoOpenIDStore
+from django_openid_auth.tests.test_views import StubOpenIDProvider
+
+
+class RenewAssociationTests(TestCase):
+
+    def setUp(self):
+        super(RenewAssociationTests, self).setUp()
+        self.provider = StubOpenIDProvider('http://example.com/')
+        setDefaultFetcher(self.provider, wrap_exceptions=False)
+        self.addCleanup(setDefaultFetcher, None)
+        self.store = DjangoOpenIDStore()
+
+    def test_renew_association(self):
+        result = renew_association(self.provider.identity_url, self.store)
+
+        self.assertTrue(result.renewed)
+        self.assertEqual(result.server_url, self.provider.endpoint_url)
+        self.assertGreater(result.expires_in, 0)
+        self.assertEqual(self.provider.last_request.mode, 'associate')
+        assoc = self.store.getAssociation(self.provider.endpoint_url)
+        self.assertEqual(assoc.handle, result.handle)
+
+    def test_valid_association_kept(self):
+        first = renew_association(self.provider.identity_url, self.store)
+        second = renew_association(self.provider.identity_url, self.store)
+
+        self.assertFalse(second.renewed)
+        self.assertEqual(second.handle, first.handle)
+        self.assertEqual(Association.objects.count(), 1)
+
+    def test_association_close_to_expiry_renewed(self):
+        first = renew_association(self.provider.identity_url, self.store)
+        # Make the existing association an older one.
+        Association.objects.update(issued=F('issued') - 60)
+        second = renew_association(
+            self.provider.identity_url, self.store,
+            renew_before=first.expires_in)
+
+        self.assertTrue(second.renewed)
+        self.assertNotEqual(second.handle, first.handle)
+        # The new association is the one logins will use.
+        assoc = self.store.getAssociation(self.provider.endpoint_url)
+        self.assertEqual(assoc.handle, second.handle)
+
+    def test_discovery_failure(self):
+        self.assertRaises(
+            AssociationRenewalFailed, renew_association,
+            'http://example.com/unknown', self.store)
+
+    @override_settings(OPENID_SSO_SERVER_URL='http://example.com/identity')
+    def test_renew_associations(self):
+        results = renew_associations(['http://example.com/unknown'])
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0][1], AssociationRenewalFailed)
+
+        results = renew_associations()
+        self.assertEqual(
+            [identifier for identifier, result in results],
+            ['http://example.com/identity'])
+        self.assertIsInstance(results[0][1], RenewalResult)
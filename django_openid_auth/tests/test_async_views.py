@@ -0,0 +1,160 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import unicode_literals
+
+from importlib import import_module
+from unittest import skipIf
+
+from django import VERSION
+from django.conf.urls import url
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch
+from openid.consumer.discover import (
+    OPENID_2_0_TYPE,
+    OPENID_IDP_2_0_TYPE,
+    OpenIDServiceEndpoint,
+)
+from openid.fetchers import setDefaultFetcher
+from openid.server.server import ENCODE_URL
+from six.moves.urllib.parse import parse_qsl
+
+from django_openid_auth.discovery import PrefetchedDiscovery
+from django_openid_auth.models import UserOpenID
+from django_openid_auth.tests.helpers import override_session_serializer
+from django_openid_auth.tests.test_views import StubOpenIDProvider
+from django_openid_auth.tests.urls import get_user
+from django_openid_auth.views import logo
+
+ASYNC_VIEWS_SUPPORTED = VERSION >= (3, 1)
+
+if ASYNC_VIEWS_SUPPORTED:
+    from django_openid_auth.async_views import (
+        login_begin,
+        login_complete,
+        needs_rediscovery,
+    )
+
+    # This module serves as the URLconf for the tests below.
+    urlpatterns = [
+        url(r'^getuser/$', get_user),
+        url(r'^openid/login/$', login_begin, name='openid-login'),
+        url(r'^openid/complete/$', login_complete, name='openid-complete'),
+        url(r'^openid/logo.gif$', logo, name='openid-logo'),
+    ]
+
+
+@skipIf(not ASYNC_VIEWS_SUPPORTED, 'Async views need Django 3.1 or later')
+@override_session_serializer
+@override_settings(
+    OPENID_CREATE_USERS=False,
+    OPENID_UPDATE_DETAILS_FROM_SREG=False,
+    OPENID_SSO_SERVER_URL=None,
+    OPENID_LAUNCHPAD_TEAMS_MAPPING={},
+    ROOT_URLCONF='django_openid_auth.tests.test_async_views',
+)
+class AsyncViewsTests(TestCase):
+
+    def setUp(self):
+        super(AsyncViewsTests, self).setUp()
+        self.provider = StubOpenIDProvider('http://example.com/')
+        setDefaultFetcher(self.provider, wrap_exceptions=False)
+        self.addCleanup(setDefaultFetcher, None)
+
+    def test_login(self):
+        user = User.objects.create_user('someuser', 'someone@example.com')
+        UserOpenID.objects.create(
+            user=user,
+            claimed_id='http://example.com/identity',
+            display_id='http://example.com/identity')
+
+        with patch.object(
+                PrefetchedDiscovery, 'prefetch', autospec=True,
+                side_effect=PrefetchedDiscovery.prefetch) as prefetch:
+            response = self.client.post(
+                '/openid/login/',
+                {'openid_identifier': 'http://example.com/identity',
+                 'next': '/getuser/'})
+            self.assertContains(response, 'OpenID transaction in progress')
+
+            openid_request = self.provider.parseFormPost(
+                response.content.decode('utf-8'))
+            openid_response = openid_request.answer(True)
+            openid_response.whichEncoding = lambda: ENCODE_URL
+            webresponse = self.provider.server.encodeResponse(
+                openid_response)
+            query = webresponse.headers['location'].split('?', 1)[1]
+            response = self.client.get(
+                '/openid/complete/', dict(parse_qsl(query)))
+            self.assertRedirects(response, '/getuser/')
+
+        # Discovery ran once, ahead of login_begin, and the endpoint saved
+        # in the session was enough to complete the login.
+        self.assertEqual(
+            [call[0][1] for call in prefetch.call_args_list],
+            ['http://example.com/identity'])
+        response = self.client.get('/getuser/')
+        self.assertEqual(response.content.decode('utf-8'), 'someuser')
+
+    def test_login_form_displayed(self):
+        response = self.client.get('/openid/login/')
+        self.assertTemplateUsed(response, 'openid/login.html')
+
+    def test_needs_rediscovery(self):
+        claimed_id = 'http://example.com/identity'
+        claimed = OpenIDServiceEndpoint()
+        claimed.claimed_id = claimed_id
+        claimed.type_uris = [OPENID_2_0_TYPE]
+        op_identifier = OpenIDServiceEndpoint()
+        op_identifier.type_uris = [OPENID_IDP_2_0_TYPE]
+        key = '_openid_consumer_last_token'
+
+        request = RequestFactory().get('/')
+        for session, expected in [
+                ({}, True),
+                ({'OPENID': {key: op_identifier}}, True),
+                ({'OPENID': {key: claimed}}, False)]:
+            request.session = session
+            self.assertEqual(
+                needs_rediscovery(request, claimed_id), expected)
+            self.assertEqual(
+                needs_rediscovery(request, claimed_id + '#fragment'),
+                expected)
+
+
+@skipIf(ASYNC_VIEWS_SUPPORTED, 'Async views are supported')
+class AsyncViewsUnsupportedTests(TestCase):
+
+    def test_import_fails(self):
+        self.assertRaises(
+            ImproperlyConfigured, import_module,
+            'django_openid_auth.async_views')
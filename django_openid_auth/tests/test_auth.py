@@ -29,6 +29,7 @@
 from __future__ import unicode_literals
 
 import re
+from unittest import skipIf
 try:
     from urllib.parse import urljoin
 except ImportError:
@@ -37,8 +38,10 @@ except ImportError:
 from django.conf import settings
 from django.contrib.auth.models import Group, Permission, User
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
 from django.test import TestCase
 from django.test.utils import override_settings
+from mock import patch
 from openid.consumer.consumer import (
     CancelResponse,
     FailureResponse,
@@ -58,7 +61,7 @@ from django_openid_auth.exceptions import (
 )
 from django_openid_auth.models import UserOpenID
 from django_openid_auth.signals import openid_duplicate_username
-from django_openid_auth.teams import ns_uri as TEAMS_NS
+from django_openid_auth.teams import TeamsResponse, ns_uri as TEAMS_NS
 from django_openid_auth.tests.helpers import override_session_serializer
 
 
@@ -447,6 +450,56 @@ class OpenIDBackendTests(TestCase):
             user.username, 'testuser3',
             'Username must contain numeric suffix to avoid collisions.')
 
+    def test_available_username_query_count_independent_of_collisions(self):
+        def allocate(nickname, collisions):
+            User.objects.create_user(nickname)
+            for i in range(1, collisions + 1):
+                User.objects.create_user(nickname + str(i))
+            # The existence check, the identity lookup, the count of
+            # usernames starting with the nickname and a single fetch of
+            # the colliding usernames.
+            with self.assertNumQueries(4):
+                return self.backend._get_available_username_for_nickname(
+                    nickname, 'http://example.com/identity')
+
+        self.assertEqual(allocate('few', 2), 'few4')
+        self.assertEqual(allocate('many', 50), 'many52')
+
+    def test_available_username_ignores_case_on_mysql(self):
+        User.objects.create_user('someuser')
+        User.objects.create_user('SomeUser2')
+        User.objects.create_user('SOMEUSER3')
+
+        # On MySQL 'someuser2' would clash with 'SomeUser2' on insert.
+        with patch.object(connection, 'vendor', 'mysql'):
+            self.assertEqual(
+                self.backend._get_available_username_for_nickname(
+                    'someuser', 'http://example.com/identity'),
+                'someuser4')
+
+    def test_available_username_numbering_is_case_sensitive(self):
+        # SQLite's LIKE only ignores the case of ASCII letters, so the
+        # usernames differ in the case of a non-ASCII one.
+        User.objects.create_user('j\xfcrgen')
+        User.objects.create_user('j\xdcrgenx')
+        User.objects.create_user('j\xdcrgen2')
+
+        # Outside MySQL usernames differing in case don't collide, and
+        # aren't counted towards the suffix.
+        self.assertEqual(
+            self.backend._get_available_username_for_nickname(
+                'j\xfcrgen', 'http://example.com/identity'),
+            'j\xfcrgen2')
+
+    def test_available_username_escapes_nickname(self):
+        User.objects.create_user('some.user')
+        User.objects.create_user('someXuser2')
+
+        self.assertEqual(
+            self.backend._get_available_username_for_nickname(
+                'some.user', 'http://example.com/identity'),
+            'some.user2')
+
     @override_settings(
         OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO=True,
         OPENID_LAUNCHPAD_TEAMS_REQUIRED=['team'])
@@ -667,6 +720,31 @@ class OpenIDBackendTests(TestCase):
         self.assert_account_not_verified(unverified_user)
         self.assert_no_users_created(expected_count=expected_user_count)
 
+    @override_settings(
+        OPENID_UPDATE_DETAILS_FROM_SREG=True,
+        OPENID_VALID_VERIFICATION_SCHEMES={
+            SERVER_URL: {'token_via_email'}},
+        OPENID_LAUNCHPAD_TEAMS_MAPPING={'team1': 'group1', 'team2': 'group2'},
+        OPENID_LAUNCHPAD_STAFF_TEAMS=['team1'])
+    def test_auth_returning_user_query_budget(self):
+        Group.objects.create(name='group1')
+        Group.objects.create(name='group2')
+        self.message.set_ax_args(
+            email='foo@example.com', fullname='Some User', verified=True)
+        self.message.set_team_args(is_member='team1,team2')
+        self.make_user_openid(claimed_id=self.message.endpoint.claimed_id)
+        # The first login brings the user's details up to date.
+        self.backend.authenticate(openid_response=self.message.to_response())
+
+        # A returning user with unchanged details needs: the UserOpenID
+        # and user lookup, the permission check, and the group sync
+        # (two SELECTs inside a savepoint).  Nothing is written.
+        with self.assertNumQueries(6):
+            user = self.backend.authenticate(
+                openid_response=self.message.to_response())
+        self.assertTrue(user.is_staff)
+        self.assertEqual(user.email, 'foo@example.com')
+
     @override_settings(OPENID_PHYSICAL_MULTIFACTOR_REQUIRED=True)
     def test_physical_multifactor_required_not_given(self):
         response = self.message.to_response()
@@ -1034,6 +1112,163 @@ class OpenIDBackendTests(TestCase):
             'In strict mode, when conflicts are handled, the username must '
             'be kept unmodified without numbered suffixes.')
 
+    def _sync_groups(self, user, is_member, mapping):
+        teams_response = TeamsResponse(is_member=is_member)
+        with self.settings(OPENID_LAUNCHPAD_TEAMS_MAPPING=mapping):
+            self.backend.update_groups_from_teams(user, teams_response)
+
+    def test_update_groups_from_teams(self):
+        user = User.objects.create_user('someuser')
+        mapping = dict(('team%d' % i, 'group%d' % i) for i in range(4))
+        for group_name in mapping.values():
+            Group.objects.create(name=group_name)
+        unmapped = Group.objects.create(name='unmapped')
+        user.groups.add(Group.objects.get(name='group0'), unmapped)
+
+        self._sync_groups(user, ['team1', 'team2', 'unknown'], mapping)
+
+        self.assertEqual(
+            sorted(user.groups.values_list('name', flat=True)),
+            ['group1', 'group2', 'unmapped'])
+
+    def test_update_groups_from_teams_constant_queries(self):
+        mapping = dict(('team%d' % i, 'group%d' % i) for i in range(50))
+        for group_name in mapping.values():
+            Group.objects.create(name=group_name)
+
+        few = User.objects.create_user('few')
+        many = User.objects.create_user('many')
+        few.groups.add(Group.objects.get(name='group49'))
+        many.groups.add(Group.objects.get(name='group49'))
+        # Two SELECTs, one DELETE and one INSERT, plus the savepoint.
+        with self.assertNumQueries(6):
+            self._sync_groups(few, ['team0', 'team1'], mapping)
+        with self.assertNumQueries(6):
+            self._sync_groups(
+                many, ['team%d' % i for i in range(48)], mapping)
+        self.assertEqual(many.groups.count(), 48)
+
+
+@skipIf(not hasattr(OpenIDBackend, 'aauthenticate'),
+        'aauthenticate() needs Python 3 and asgiref')
+@override_settings(
+    OPENID_CREATE_USERS=True,
+    OPENID_USE_EMAIL_FOR_USERNAME=False,
+    OPENID_LAUNCHPAD_TEAMS_REQUIRED=[],
+    OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO=False,
+    OPENID_EMAIL_WHITELIST_REGEXP_LIST=[])
+class AsyncOpenIDBackendTests(TestCase):
+
+    def setUp(self):
+        super(AsyncOpenIDBackendTests, self).setUp()
+        self.backend = OpenIDBackend()
+        self.message = TestMessage()
+
+    def aauthenticate(self, **kwargs):
+        from asgiref.sync import async_to_sync
+        return async_to_sync(self.backend.aauthenticate)(**kwargs)
+
+    def make_user_openid(self):
+        user = User.objects.create_user(
+            username='someuser', email='someuser@example.com')
+        return UserOpenID.objects.create(
+            user=user, claimed_id=self.message.endpoint.claimed_id,
+            display_id=self.message.endpoint.claimed_id)
+
+    def test_aauthenticate_no_response(self):
+        self.assertIsNone(self.aauthenticate())
+        self.assertIsNone(self.aauthenticate(
+            openid_response=CancelResponse(OpenIDServiceEndpoint())))
+
+    def test_aauthenticate_returning_user(self):
+        user_openid = self.make_user_openid()
+        user = self.aauthenticate(openid_response=self.message.to_response())
+        self.assertEqual(user, user_openid.user)
+
+    def test_aauthenticate_creates_user(self):
+        self.message.set_sreg_args(nickname='newuser')
+        user = self.aauthenticate(openid_response=self.message.to_response())
+        self.assertEqual(user.username, 'newuser')
+        self.assertEqual(
+            UserOpenID.objects.get(user=user).claimed_id,
+            self.message.endpoint.claimed_id)
+
+    @override_settings(
+        OPENID_UPDATE_DETAILS_FROM_SREG=True,
+        OPENID_VALID_VERIFICATION_SCHEMES={
+            SERVER_URL: {'token_via_email'}})
+    def test_aauthenticate_updates_details(self):
+        user_openid = self.make_user_openid()
+        self.message.set_ax_args(
+            email='new@example.com', fullname='New Name', verified=True)
+        user = self.aauthenticate(openid_response=self.message.to_response())
+
+        user = User.objects.get(pk=user_openid.user.pk)
+        self.assertEqual(user.email, 'new@example.com')
+        self.assertEqual(user.first_name, 'New')
+        self.assertTrue(user.has_perm('django_openid_auth.account_verified'))
+
+        self.message.set_ax_args(
+            email='new@example.com', fullname='New Name', verified=False)
+        self.aauthenticate(openid_response=self.message.to_response())
+        user = User.objects.get(pk=user.pk)
+        self.assertFalse(
+            user.has_perm('django_openid_auth.account_verified'))
+
+    @override_settings(OPENID_STRICT_USERNAMES=True)
+    def test_aauthenticate_strict_usernames_conflict(self):
+        User.objects.create_user('someuser')
+        self.message.set_sreg_args(nickname='someuser')
+        with self.assertRaises(DuplicateUsernameViolation):
+            self.aauthenticate(openid_response=self.message.to_response())
+
+    @override_settings(
+        OPENID_LAUNCHPAD_TEAMS_MAPPING={'team1': 'group1', 'team2': 'group2'},
+        OPENID_LAUNCHPAD_STAFF_TEAMS=['team1'])
+    def test_aauthenticate_syncs_teams(self):
+        group1 = Group.objects.create(name='group1')
+        group2 = Group.objects.create(name='group2')
+        user_openid = self.make_user_openid()
+        user_openid.user.groups.add(group2)
+        self.message.set_team_args(is_member='team1')
+
+        user = self.aauthenticate(openid_response=self.message.to_response())
+
+        self.assertEqual(list(user.groups.all()), [group1])
+        self.assertTrue(User.objects.get(pk=user.pk).is_staff)
+
+    @override_settings(
+        OPENID_LAUNCHPAD_TEAMS_MAPPING={'team': 'group'},
+        OPENID_LAUNCHPAD_TEAMS_REQUIRED=['team'])
+    def test_aauthenticate_teams_required(self):
+        Group.objects.create(name='group')
+        self.make_user_openid()
+        self.message.set_team_args(is_member='other')
+        self.assertIsNone(
+            self.aauthenticate(openid_response=self.message.to_response()))
+
+        self.message.set_team_args(is_member='team')
+        self.assertIsNotNone(
+            self.aauthenticate(openid_response=self.message.to_response()))
+
+    @override_settings(
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO=True,
+        OPENID_LAUNCHPAD_TEAMS_REQUIRED=['team'])
+    def test_aauthenticate_teams_required_auto_mapping(self):
+        # With nothing cached, the automatic mapping is read from the
+        # groups, which must not happen in the event loop.
+        Group.objects.create(name='team')
+        self.make_user_openid()
+        self.message.set_team_args(is_member='other')
+        self.assertIsNone(
+            self.aauthenticate(openid_response=self.message.to_response()))
+
+        self.message.set_team_args(is_member='team')
+        self.assertIsNotNone(
+            self.aauthenticate(openid_response=self.message.to_response()))
+
 
 class GetGroupModelTestCase(TestCase):
 
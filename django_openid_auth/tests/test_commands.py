@@ -0,0 +1,232 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import unicode_literals
+
+import time
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import override_settings
+from mock import patch
+from openid.association import Association as OIDAssociation
+from openid.fetchers import setDefaultFetcher
+from openid.store.nonce import SKEW
+from six import StringIO
+
+from django_openid_auth.models import Association, Nonce
+from django_openid_auth.store import BucketedNonceStore, DjangoOpenIDStore
+from django_openid_auth.tests.test_views import StubOpenIDProvider
+
+
+class OpenIDCleanupCommandTests(TestCase):
+
+    def setUp(self):
+        super(OpenIDCleanupCommandTests, self).setUp()
+        store = DjangoOpenIDStore()
+        expired = int(time.time()) - 2 * SKEW
+        for i in range(3):
+            Nonce.objects.create(
+                server_url='server-url', timestamp=expired, salt='salt%d' % i)
+            store.storeAssociation(
+                'server-url', OIDAssociation(
+                    'handle%d' % i, 'secret', expired, 60, 'HMAC-SHA1'))
+        store.useNonce('server-url', time.time(), 'fresh')
+
+    def call_command(self, *args, **kwargs):
+        stdout = StringIO()
+        call_command('openid_cleanup', *args, stdout=stdout, **kwargs)
+        return stdout.getvalue()
+
+    def test_cleanup(self):
+        output = self.call_command()
+        self.assertIn('Deleted 3 nonces', output)
+        self.assertIn('Deleted 3 associations', output)
+        self.assertIn('rows/s', output)
+        self.assertEqual(Nonce.objects.count(), 1)
+        self.assertEqual(Association.objects.count(), 0)
+
+    @override_settings(
+        OPENID_STORE_CLASS='django_openid_auth.store.BucketedNonceStore')
+    def test_cleanup_bucketed_nonces(self):
+        store = BucketedNonceStore()
+        self.addCleanup(BucketedNonceStore._created_buckets.clear)
+        now = time.time()
+        store.useNonce('server-url', now, 'bucketed')
+        later = int(now + 3 * SKEW)
+        with patch('time.time', return_value=later):
+            output = self.call_command('--nonces-only')
+        self.assertIn('Deleted 5 nonces', output)
+        # Only the tables created ahead of time are left.
+        self.assertEqual(
+            store._buckets(connection)[0], store._bucket(later))
+
+    @override_settings(
+        OPENID_STORE_CLASS='django_openid_auth.store.BucketedNonceStore')
+    def test_cleanup_creates_bucketed_nonce_tables(self):
+        store = BucketedNonceStore()
+        self.addCleanup(BucketedNonceStore._created_buckets.clear)
+        now = int(time.time())
+        with patch('time.time', return_value=now):
+            self.call_command('--nonces-only')
+        self.assertEqual(
+            store._buckets(connection),
+            list(range(now // SKEW, (now + SKEW) // SKEW + 2)))
+
+        self.call_command('--associations-only')
+        self.call_command('--dry-run')
+        self.assertEqual(len(store._buckets(connection)), 3)
+
+    def test_cleanup_batch_size(self):
+        output = self.call_command('--batch-size', '2', verbosity=2)
+        self.assertIn('Deleted batch of 2 nonces', output)
+        self.assertIn('Deleted batch of 1 nonces', output)
+        self.assertIn('Deleted 3 nonces', output)
+        self.assertEqual(Nonce.objects.count(), 1)
+        self.assertEqual(Association.objects.count(), 0)
+
+    def test_cleanup_invalid_batch_size(self):
+        self.assertRaises(
+            CommandError, self.call_command, '--batch-size', '0')
+
+    def test_cleanup_nonces_only(self):
+        output = self.call_command('--nonces-only')
+        self.assertNotIn('associations', output)
+        self.assertEqual(Nonce.objects.count(), 1)
+        self.assertEqual(Association.objects.count(), 3)
+
+    def test_cleanup_associations_only(self):
+        output = self.call_command('--associations-only')
+        self.assertNotIn('nonces', output)
+        self.assertEqual(Nonce.objects.count(), 4)
+        self.assertEqual(Association.objects.count(), 0)
+
+    def test_cleanup_only_options_are_exclusive(self):
+        self.assertRaises(
+            CommandError, self.call_command, '--nonces-only',
+            '--associations-only')
+
+    def test_cleanup_dry_run(self):
+        output = self.call_command('--dry-run')
+        self.assertIn('Would delete 3 nonces', output)
+        self.assertIn('Would delete 3 associations', output)
+        self.assertEqual(Nonce.objects.count(), 4)
+        self.assertEqual(Association.objects.count(), 3)
+
+    @patch('django_openid_auth.management.commands.openid_cleanup.'
+           'close_old_connections')
+    @patch('django_openid_auth.management.commands.openid_cleanup.time.sleep')
+    def test_cleanup_loop_interval(self, mock_sleep, mock_close):
+        # Stop the loop the second time the command goes to sleep.
+        mock_sleep.side_effect = [None, KeyboardInterrupt]
+        output = self.call_command('--loop-interval', '30')
+        self.assertEqual(output.count('Deleted 3 nonces'), 1)
+        self.assertEqual(output.count('Deleted 0 nonces'), 1)
+        mock_sleep.assert_called_with(30)
+
+    @patch('django_openid_auth.management.commands.openid_cleanup.'
+           'close_old_connections')
+    @patch('django_openid_auth.management.commands.openid_cleanup.time.sleep')
+    def test_cleanup_loop_survives_errors(self, mock_sleep, mock_close):
+        mock_sleep.side_effect = [None, KeyboardInterrupt]
+        stderr = StringIO()
+        with patch.object(DjangoOpenIDStore, 'cleanupNonces',
+                          side_effect=[DatabaseError('gone away'), 3]):
+            output = self.call_command(
+                '--loop-interval', '30', '--nonces-only', stderr=stderr)
+        self.assertIn('Cleanup failed: gone away', stderr.getvalue())
+        self.assertEqual(output.count('Deleted 3 nonces'), 1)
+        self.assertEqual(mock_close.call_count, 2)
+
+    def test_cleanup_error_without_loop(self):
+        with patch.object(DjangoOpenIDStore, 'cleanupNonces',
+                          side_effect=DatabaseError('gone away')):
+            self.assertRaises(DatabaseError, self.call_command)
+
+
+class OpenIDRenewAssociationsCommandTests(TestCase):
+
+    def setUp(self):
+        super(OpenIDRenewAssociationsCommandTests, self).setUp()
+        self.provider = StubOpenIDProvider('http://example.com/')
+        setDefaultFetcher(self.provider, wrap_exceptions=False)
+        self.addCleanup(setDefaultFetcher, None)
+
+    def call_command(self, *args, **kwargs):
+        stdout = StringIO()
+        call_command(
+            'openid_renew_associations', *args, stdout=stdout, **kwargs)
+        return stdout.getvalue()
+
+    @override_settings(OPENID_SSO_SERVER_URL='http://example.com/identity')
+    def test_renew(self):
+        output = self.call_command()
+        self.assertIn(
+            'Renewed association with http://example.com/endpoint', output)
+        self.assertEqual(Association.objects.count(), 1)
+
+        output = self.call_command()
+        self.assertIn(
+            'Association with http://example.com/endpoint is valid for',
+            output)
+        self.assertEqual(Association.objects.count(), 1)
+
+    @override_settings(OPENID_SSO_SERVER_URL=None)
+    def test_renew_given_identifier(self):
+        output = self.call_command('http://example.com/identity')
+        self.assertIn('Renewed association', output)
+
+    @override_settings(OPENID_SSO_SERVER_URL=None)
+    def test_no_identifiers(self):
+        self.assertRaises(CommandError, self.call_command)
+
+    @override_settings(OPENID_SSO_SERVER_URL='http://example.com/identity')
+    @patch('django_openid_auth.management.commands.'
+           'openid_renew_associations.close_old_connections')
+    @patch('django_openid_auth.management.commands.'
+           'openid_renew_associations.time.sleep')
+    def test_loop_survives_errors(self, mock_sleep, mock_close):
+        mock_sleep.side_effect = [None, KeyboardInterrupt]
+        stderr = StringIO()
+        with patch('django_openid_auth.management.commands.'
+                   'openid_renew_associations.renew_associations',
+                   side_effect=[DatabaseError('gone away'), []]):
+            self.call_command('--loop-interval', '30', stderr=stderr)
+        self.assertIn('Renewal failed: gone away', stderr.getvalue())
+        self.assertEqual(mock_close.call_count, 2)
+
+    @override_settings(OPENID_SSO_SERVER_URL=None)
+    def test_failure(self):
+        stderr = StringIO()
+        self.assertRaises(
+            CommandError, self.call_command, 'http://example.com/unknown',
+            stderr=stderr)
+        self.assertIn('http://example.com/unknown', stderr.getvalue())
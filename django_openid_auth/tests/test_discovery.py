@@ -0,0 +1,262 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import unicode_literals
+
+import threading
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+from mock import patch
+from openid.consumer.discover import DiscoveryFailure, OpenIDServiceEndpoint
+from openid.fetchers import (
+    HTTPFetcher,
+    HTTPResponse,
+    getDefaultFetcher,
+    setDefaultFetcher,
+)
+
+from django_openid_auth.discovery import (
+    HeaderRecordingFetcher,
+    PrefetchedDiscovery,
+    discover,
+    get_max_age,
+    normalize_identifier,
+)
+
+
+XRDS = """\
+<?xml version="1.0"?>
+<xrds:XRDS xmlns="xri://$xrd*($v*2.0)" xmlns:xrds="xri://$xrds">
+  <XRD>
+    <Service priority="0">
+      <Type>http://specs.openid.net/auth/2.0/server</Type>
+      <URI>http://example.com/endpoint</URI>
+    </Service>
+  </XRD>
+</xrds:XRDS>
+"""
+
+
+class FakeFetcher(HTTPFetcher):
+    """Serve an XRDS document for a single identifier, counting fetches."""
+
+    def __init__(self, url, headers=None, status=200, body=XRDS):
+        super(FakeFetcher, self).__init__()
+        self.url = url
+        self.headers = {'content-type': 'application/xrds+xml'}
+        self.headers.update(headers or {})
+        self.status = status
+        self.body = body
+        self.fetches = 0
+
+    def fetch(self, url, body=None, headers=None):
+        self.fetches += 1
+        return HTTPResponse(url, self.status, self.headers, self.body)
+
+
+class OtherThreadFetcher(FakeFetcher):
+    """Make an uncacheable request from another thread during each
+    fetch of the identifier."""
+
+    def fetch(self, url, body=None, headers=None):
+        if url != self.url:
+            return HTTPResponse(url, 200, {'cache-control': 'no-store'}, '')
+        thread = threading.Thread(
+            target=getDefaultFetcher().fetch,
+            args=('http://example.com/other',))
+        thread.start()
+        thread.join()
+        return super(OtherThreadFetcher, self).fetch(url, body, headers)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    OPENID_DISCOVERY_CACHE_TIMEOUT=300)
+class DiscoveryCacheTests(TestCase):
+
+    url = 'http://example.com/'
+
+    def setUp(self):
+        super(DiscoveryCacheTests, self).setUp()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.addCleanup(setDefaultFetcher, None)
+
+    def use_fetcher(self, **kwargs):
+        fetcher = FakeFetcher(self.url, **kwargs)
+        setDefaultFetcher(fetcher, wrap_exceptions=False)
+        return fetcher
+
+    def test_discover_cached(self):
+        fetcher = self.use_fetcher()
+        claimed_id, services = discover(self.url)
+        self.assertEqual(claimed_id, self.url)
+        self.assertEqual(len(services), 1)
+        self.assertIsInstance(services[0], OpenIDServiceEndpoint)
+        self.assertEqual(services[0].server_url, 'http://example.com/endpoint')
+
+        # The identifier is normalized before looking up the cache.
+        cached_id, cached_services = discover('example.com')
+        self.assertEqual(cached_id, claimed_id)
+        self.assertEqual(
+            [s.server_url for s in cached_services],
+            [s.server_url for s in services])
+        self.assertEqual(fetcher.fetches, 1)
+
+    @override_settings(OPENID_DISCOVERY_CACHE_TIMEOUT=0)
+    def test_discover_not_cached_without_timeout(self):
+        fetcher = self.use_fetcher()
+        discover(self.url)
+        discover(self.url)
+        self.assertEqual(fetcher.fetches, 2)
+
+    def test_discover_honours_no_cache(self):
+        fetcher = self.use_fetcher(headers={'Cache-Control': 'no-cache'})
+        discover(self.url)
+        discover(self.url)
+        self.assertEqual(fetcher.fetches, 2)
+
+    def test_discover_failure_not_cached(self):
+        fetcher = self.use_fetcher(status=404)
+        self.assertRaises(DiscoveryFailure, discover, self.url)
+        self.assertRaises(DiscoveryFailure, discover, self.url)
+        self.assertEqual(fetcher.fetches, 2)
+
+    def test_discover_without_services_not_cached(self):
+        fetcher = self.use_fetcher(
+            headers={'content-type': 'text/html'},
+            body='<html><head><title>Down for maintenance</title></head>'
+                 '</html>')
+        self.assertEqual(discover(self.url), (self.url, []))
+        self.assertEqual(discover(self.url), (self.url, []))
+        self.assertEqual(fetcher.fetches, 2)
+
+    def test_discover_installs_recording_fetcher_once(self):
+        fetcher = self.use_fetcher()
+        discover(self.url)
+        recorder = getDefaultFetcher()
+        self.assertIsInstance(recorder, HeaderRecordingFetcher)
+        self.assertIs(recorder.fetcher, fetcher)
+
+        caches['default'].clear()
+        discover(self.url)
+        self.assertIs(getDefaultFetcher(), recorder)
+
+    def test_other_threads_fetches_not_recorded(self):
+        fetcher = OtherThreadFetcher(self.url)
+        setDefaultFetcher(fetcher, wrap_exceptions=False)
+        discover(self.url)
+        discover(self.url)
+        # The uncacheable response fetched by the other thread did not
+        # stop the discovery result from being cached.
+        self.assertEqual(fetcher.fetches, 1)
+
+    def test_concurrent_discoveries_not_serialized(self):
+        fetcher = self.use_fetcher()
+        both_fetching = threading.Event()
+        active = []
+        waited = []
+
+        # Each fetch waits for the other one to start.
+        def fetch(url, body=None, headers=None):
+            active.append(url)
+            if len(active) == 2:
+                both_fetching.set()
+            waited.append(both_fetching.wait(5))
+            return HTTPResponse(url, 200, fetcher.headers, XRDS)
+        with patch.object(fetcher, 'fetch', side_effect=fetch):
+            threads = [
+                threading.Thread(target=discover, args=(url,))
+                for url in (self.url, 'http://example.org/')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(waited, [True, True])
+
+
+class PrefetchedDiscoveryTests(TestCase):
+
+    url = 'http://example.com/'
+
+    def setUp(self):
+        super(PrefetchedDiscoveryTests, self).setUp()
+        self.fetcher = FakeFetcher(self.url)
+        setDefaultFetcher(self.fetcher, wrap_exceptions=False)
+        self.addCleanup(setDefaultFetcher, None)
+
+    def test_prefetched_result_used(self):
+        discovery = PrefetchedDiscovery()
+        discovery.prefetch(self.url)
+        self.assertEqual(self.fetcher.fetches, 1)
+
+        claimed_id, services = discovery(self.url)
+        self.assertEqual(claimed_id, self.url)
+        self.assertEqual(len(services), 1)
+        self.assertEqual(self.fetcher.fetches, 1)
+
+    def test_prefetched_failure_raised(self):
+        self.fetcher.status = 404
+        discovery = PrefetchedDiscovery()
+        discovery.prefetch(self.url)
+        self.assertRaises(DiscoveryFailure, discovery, self.url)
+        self.assertEqual(self.fetcher.fetches, 1)
+
+    def test_other_identifiers_discovered(self):
+        discovery = PrefetchedDiscovery()
+        claimed_id, services = discovery(self.url)
+        self.assertEqual(claimed_id, self.url)
+        self.assertEqual(self.fetcher.fetches, 1)
+
+
+class DiscoveryHelperTests(TestCase):
+
+    def test_get_max_age(self):
+        for headers, expected in [
+                ({}, None),
+                ({'cache-control': 'public, max-age=60'}, 60),
+                ({'Cache-Control': 'max-age="30"'}, 30),
+                ({'cache-control': 'no-store'}, 0),
+                ({'cache-control': 'private, max-age=60'}, 0)]:
+            response = HTTPResponse('http://example.com/', 200, headers, '')
+            self.assertEqual(get_max_age(response), expected)
+
+    def test_normalize_identifier(self):
+        self.assertEqual(
+            normalize_identifier(' example.com '), 'http://example.com/')
+        self.assertEqual(
+            normalize_identifier('http://example.com/#fragment'),
+            'http://example.com/')
+        self.assertEqual(normalize_identifier('=example'), '=example')
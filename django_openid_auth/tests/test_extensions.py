@@ -0,0 +1,189 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import unicode_literals
+
+import time
+
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+from openid.consumer.discover import OpenIDServiceEndpoint
+from openid.extensions import ax, sreg
+from mock import patch
+
+from django_openid_auth import teams
+from django_openid_auth.extensions import (
+    ExtensionRequestCache,
+    build_extension_requests,
+    extension_request_cache,
+    get_extension_requests,
+)
+
+
+@override_settings(
+    OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO=True,
+    OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO_BLACKLIST=[],
+    OPENID_PHYSICAL_MULTIFACTOR_REQUIRED=False,
+    OPENID_SREG_REQUIRED_FIELDS=[],
+    OPENID_VALID_VERIFICATION_SCHEMES={})
+class ExtensionRequestsTests(TestCase):
+
+    def setUp(self):
+        super(ExtensionRequestsTests, self).setUp()
+        extension_request_cache.clear()
+        self.addCleanup(extension_request_cache.clear)
+        self.endpoint = OpenIDServiceEndpoint()
+        self.endpoint.server_url = 'http://example.com/'
+        self.endpoint.type_uris = ['http://specs.openid.net/auth/2.0/server']
+        Group.objects.create(name='group1')
+
+    def get_args(self, extensions):
+        return dict(
+            (extension.ns_uri, extension.getExtensionArgs())
+            for extension in extensions)
+
+    def test_matches_built_requests(self):
+        self.assertEqual(
+            self.get_args(get_extension_requests(self.endpoint)),
+            self.get_args(build_extension_requests(self.endpoint)))
+
+    def test_reused_without_queries(self):
+        extensions = get_extension_requests(self.endpoint)
+        with self.assertNumQueries(0):
+            self.assertIs(get_extension_requests(self.endpoint), extensions)
+
+    def test_keyed_by_endpoint_type(self):
+        sreg_args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertIn(sreg.ns_uri, sreg_args)
+
+        self.endpoint.type_uris.append(ax.AXMessage.ns_uri)
+        ax_args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertIn(ax.AXMessage.ns_uri, ax_args)
+        self.assertNotIn(sreg.ns_uri, ax_args)
+
+    def test_group_changes_invalidate(self):
+        args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertEqual(args[teams.ns_uri], {'query_membership': 'group1'})
+
+        group = Group.objects.create(name='group2')
+        args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertEqual(
+            sorted(args[teams.ns_uri]['query_membership'].split(',')),
+            ['group1', 'group2'])
+
+        group.delete()
+        args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertEqual(args[teams.ns_uri], {'query_membership': 'group1'})
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+        },
+        OPENID_TEAMS_MAPPING_CACHE_TIMEOUT=1)
+    def test_unsignalled_group_changes_seen_after_timeout(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertEqual(args[teams.ns_uri], {'query_membership': 'group1'})
+
+        # A group created by another process (or in bulk) doesn't change
+        # the mapping version seen here, but shows up once the cached
+        # mapping times out.
+        Group.objects.bulk_create([Group(name='group2')])
+        with patch('time.time', return_value=time.time() + 2):
+            args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertEqual(
+            sorted(args[teams.ns_uri]['query_membership'].split(',')),
+            ['group1', 'group2'])
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            },
+        })
+    def test_group_changes_seen_without_shared_cache(self):
+        args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertEqual(args[teams.ns_uri], {'query_membership': 'group1'})
+
+        Group.objects.create(name='group2')
+        args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertEqual(
+            sorted(args[teams.ns_uri]['query_membership'].split(',')),
+            ['group1', 'group2'])
+
+    def test_setting_changes_invalidate(self):
+        args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertNotIn('required', args[sreg.ns_uri])
+
+        with self.settings(OPENID_SREG_REQUIRED_FIELDS=['email']):
+            args = self.get_args(get_extension_requests(self.endpoint))
+            self.assertEqual(args[sreg.ns_uri]['required'], 'email')
+
+        args = self.get_args(get_extension_requests(self.endpoint))
+        self.assertNotIn('required', args[sreg.ns_uri])
+
+
+class ExtensionRequestCacheTests(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = ExtensionRequestCache(max_size=2)
+        cache.get('a', lambda: ['a'])
+        cache.get('b', lambda: ['b'])
+        # Touch 'a' so that 'b' is the oldest entry.
+        cache.get('a', lambda: ['new a'])
+        cache.get('c', lambda: ['c'])
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a', lambda: ['new a']), ['a'])
+        self.assertEqual(cache.get('b', lambda: ['new b']), ['new b'])
+
+    @override_settings(OPENID_EXTENSION_REQUEST_CACHE_SIZE=1)
+    def test_size_from_settings(self):
+        cache = ExtensionRequestCache()
+        cache.get('a', lambda: ['a'])
+        cache.get('b', lambda: ['b'])
+        self.assertEqual(len(cache), 1)
+
+    def test_zero_size_disables_cache(self):
+        cache = ExtensionRequestCache(max_size=0)
+        cache.get('a', lambda: ['a'])
+        self.assertEqual(len(cache), 0)
+
+    def test_new_version_drops_old_entries(self):
+        cache = ExtensionRequestCache(max_size=10)
+        cache.get('a', lambda: ['a1'], version=1)
+        cache.get('b', lambda: ['b1'], version=1)
+
+        self.assertEqual(cache.get('a', lambda: ['a2'], version=2), ['a2'])
+        self.assertEqual(len(cache), 1)
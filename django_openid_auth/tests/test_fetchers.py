@@ -0,0 +1,264 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from openid import fetchers as openid_fetchers
+from openid.fetchers import (
+    HTTPFetchingError,
+    getDefaultFetcher,
+    setDefaultFetcher,
+)
+from six.moves import BaseHTTPServer, socketserver
+
+from django_openid_auth.fetchers import (
+    PooledHTTPFetcher,
+    get_fetcher,
+    install_fetcher,
+    is_installed,
+)
+from django_openid_auth.views import make_consumer
+
+
+class RecordingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Keep-alive handler that records each connection and request."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections.append(self.client_address)
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path, None))
+        if self.path == '/redirect':
+            self.respond(302, headers={'Location': '/target'})
+        elif self.path == '/drop':
+            # Answer, then close the connection without saying so.
+            self.respond(200, b'dropped')
+            self.close_connection = True
+        else:
+            self.respond(
+                200, 'caf\xe9'.encode('utf-8'),
+                {'Content-Type': 'text/plain; charset=utf-8',
+                 'X-Path': self.path})
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        body = self.rfile.read(length)
+        self.server.requests.append((
+            'POST', self.path, body, self.headers['Content-Type']))
+        self.respond(200, b'is_valid:true\n')
+
+
+class RecordingServer(socketserver.ThreadingMixIn,
+                      BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(
+            self, ('127.0.0.1', 0), RecordingHandler)
+        self.connections = []
+        self.requests = []
+
+
+class PooledHTTPFetcherTests(TestCase):
+
+    def setUp(self):
+        super(PooledHTTPFetcherTests, self).setUp()
+        self.server = RecordingServer()
+        thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': 0.01})
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.fetcher = PooledHTTPFetcher(timeout=5)
+        self.addCleanup(self.fetcher.close)
+
+    def test_fetch(self):
+        response = self.fetcher.fetch(self.base_url + '/path?query=1')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.final_url, self.base_url + '/path?query=1')
+        self.assertEqual(response.body, 'caf\xe9')
+        self.assertEqual(response.headers['x-path'], '/path?query=1')
+
+    def test_connection_reused(self):
+        for i in range(3):
+            self.fetcher.fetch(self.base_url + '/')
+        self.fetcher.fetch(self.base_url + '/', body='openid.mode=check')
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_post(self):
+        response = self.fetcher.fetch(
+            self.base_url + '/endpoint', body='openid.mode=check')
+        self.assertEqual(response.body, 'is_valid:true\n')
+        self.assertEqual(self.server.requests, [(
+            'POST', '/endpoint', b'openid.mode=check',
+            'application/x-www-form-urlencoded')])
+
+    def test_redirect_followed(self):
+        response = self.fetcher.fetch(self.base_url + '/redirect')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.final_url, self.base_url + '/target')
+
+    def test_closed_connection_retried(self):
+        self.fetcher.fetch(self.base_url + '/drop')
+        response = self.fetcher.fetch(self.base_url + '/')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_max_connections(self):
+        fetcher = PooledHTTPFetcher(timeout=0.1, max_connections=1)
+        pool = fetcher.get_pool('http', '127.0.0.1', 1)
+        connection, reused = pool.acquire()
+        self.addCleanup(pool.release, connection, False)
+        self.assertRaises(
+            HTTPFetchingError, fetcher.fetch, 'http://127.0.0.1:1/')
+
+    def test_idle_connections_expire(self):
+        self.fetcher.idle_timeout = 0
+        self.fetcher.fetch(self.base_url + '/')
+        self.fetcher.fetch(self.base_url + '/')
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_idle_connections_reaped_on_any_fetch(self):
+        self.fetcher.idle_timeout = 0.05
+        port = self.server.server_address[1]
+        self.fetcher.fetch(self.base_url + '/')
+        pool = self.fetcher.pools[('http', '127.0.0.1', port)]
+        self.assertEqual(len(pool.idle), 1)
+
+        time.sleep(0.1)
+        self.fetcher.fetch('http://localhost:%d/' % port)
+        self.assertEqual(pool.idle, [])
+
+    def test_max_pools(self):
+        self.fetcher.max_pools = 1
+        port = self.server.server_address[1]
+        self.fetcher.fetch(self.base_url + '/')
+        pool = self.fetcher.pools[('http', '127.0.0.1', port)]
+
+        self.fetcher.fetch('http://localhost:%d/' % port)
+        self.assertEqual(
+            list(self.fetcher.pools), [('http', 'localhost', port)])
+        self.assertEqual(pool.idle, [])
+
+    def test_pools_in_use_not_evicted(self):
+        fetcher = PooledHTTPFetcher(max_pools=1)
+        pool = fetcher.get_pool('http', 'example.com', 80)
+        fetcher.get_pool('http', 'example.org', 80)
+        self.assertEqual(len(fetcher.pools), 2)
+
+        fetcher.put_pool(pool)
+        fetcher.get_pool('http', 'example.net', 80)
+        self.assertEqual(
+            list(fetcher.pools),
+            [('http', 'example.org', 80), ('http', 'example.net', 80)])
+
+    def test_connection_error(self):
+        self.server.server_close()
+        self.assertRaises(
+            HTTPFetchingError, self.fetcher.fetch, self.base_url + '/')
+
+    def test_bad_scheme(self):
+        self.assertRaises(
+            ValueError, self.fetcher.fetch, 'ftp://example.com/')
+
+
+class GetFetcherTests(TestCase):
+
+    def setUp(self):
+        super(GetFetcherTests, self).setUp()
+        self.addCleanup(setDefaultFetcher, None)
+
+    def test_default(self):
+        self.assertIsNone(get_fetcher())
+
+    @override_settings(
+        OPENID_FETCHER_CLASS='django_openid_auth.fetchers.PooledHTTPFetcher',
+        OPENID_FETCHER_OPTIONS={'timeout': 3, 'max_connections': 2})
+    def test_configured(self):
+        fetcher = get_fetcher()
+        self.assertIsInstance(fetcher, PooledHTTPFetcher)
+        self.assertEqual(fetcher.timeout, 3)
+        self.assertEqual(fetcher.max_connections, 2)
+        self.assertIs(get_fetcher(), fetcher)
+
+    @override_settings(OPENID_FETCHER_CLASS='does.not.Exist')
+    def test_improperly_configured(self):
+        self.assertRaises(ImproperlyConfigured, get_fetcher)
+
+    @override_settings(
+        OPENID_FETCHER_CLASS='django_openid_auth.fetchers.PooledHTTPFetcher')
+    def test_make_consumer_installs_fetcher(self):
+        request = RequestFactory().get('/')
+        request.session = {}
+        make_consumer(request)
+        self.assertTrue(is_installed(get_fetcher()))
+
+        # Installing it again does not wrap it twice.
+        default = getDefaultFetcher()
+        make_consumer(request)
+        self.assertIs(getDefaultFetcher(), default)
+
+    @override_settings(
+        OPENID_FETCHER_CLASS='django_openid_auth.fetchers.PooledHTTPFetcher')
+    def test_installed_fetcher_wraps_errors(self):
+        install_fetcher()
+        self.assertRaises(
+            HTTPFetchingError, openid_fetchers.fetch, 'ftp://example.com/')
+
+    @override_settings(
+        OPENID_FETCHER_CLASS='django_openid_auth.fetchers.PooledHTTPFetcher')
+    def test_settings_change_uninstalls_fetcher(self):
+        install_fetcher()
+        fetcher = get_fetcher()
+        with self.settings(OPENID_FETCHER_OPTIONS={'timeout': 1}):
+            self.assertFalse(is_installed(fetcher))
@@ -0,0 +1,136 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from mock import patch
+
+from django_openid_auth.instrumentation import (
+    PhaseHistogram,
+    log_login_phase,
+    login_phase,
+)
+from django_openid_auth.models import UserOpenID
+from django_openid_auth.signals import openid_login_phase
+
+
+class LoginPhaseTests(TestCase):
+
+    def setUp(self):
+        super(LoginPhaseTests, self).setUp()
+        self.reports = []
+        openid_login_phase.connect(self.receiver, sender=UserOpenID)
+        self.addCleanup(openid_login_phase.disconnect, self.receiver,
+                        sender=UserOpenID)
+
+    def receiver(self, sender, **kwargs):
+        kwargs.pop('signal')
+        self.reports.append(kwargs)
+
+    def test_reports_duration_and_queries(self):
+        request = object()
+        with login_phase('some_phase', request):
+            User.objects.count()
+            User.objects.exists()
+
+        self.assertEqual(len(self.reports), 1)
+        report = self.reports[0]
+        self.assertEqual(report['phase'], 'some_phase')
+        self.assertIs(report['request'], request)
+        self.assertEqual(report['queries'], 2)
+        self.assertGreaterEqual(report['duration'], 0)
+
+    def test_reports_failed_phase(self):
+        with self.assertRaises(ValueError):
+            with login_phase('some_phase'):
+                raise ValueError()
+
+        self.assertEqual(
+            [report['phase'] for report in self.reports], ['some_phase'])
+
+    def test_nothing_measured_without_listeners(self):
+        openid_login_phase.disconnect(self.receiver, sender=UserOpenID)
+        with patch('django_openid_auth.instrumentation.default_timer') as t:
+            with login_phase('some_phase'):
+                pass
+        self.assertFalse(t.called)
+
+
+class LogLoginPhaseTests(TestCase):
+
+    def test_logs_phase(self):
+        with patch('django_openid_auth.instrumentation.logger') as logger:
+            log_login_phase(
+                sender=UserOpenID, phase='authenticate', duration=0.0125,
+                queries=3)
+        logger.info.assert_called_once_with(
+            'OpenID login phase %s took %.1fms and %s queries',
+            'authenticate', 12.5, 3)
+
+
+class PhaseHistogramTests(TestCase):
+
+    def test_snapshot_is_cumulative(self):
+        histogram = PhaseHistogram(buckets=(0.01, 0.1, 1))
+        for duration in (0.005, 0.01, 0.05, 2):
+            histogram(sender=UserOpenID, phase='authenticate',
+                      duration=duration, queries=2)
+        histogram(sender=UserOpenID, phase='auth_login', duration=0.5,
+                  queries=None)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(list(snapshot), ['authenticate', 'auth_login'])
+        self.assertEqual(snapshot['authenticate']['count'], 4)
+        self.assertAlmostEqual(snapshot['authenticate']['sum'], 2.065)
+        self.assertEqual(snapshot['authenticate']['queries'], 8)
+        self.assertEqual(
+            snapshot['authenticate']['buckets'],
+            [(0.01, 2), (0.1, 3), (1, 3)])
+        self.assertEqual(
+            snapshot['auth_login']['buckets'], [(0.01, 0), (0.1, 0), (1, 1)])
+        self.assertEqual(snapshot['auth_login']['queries'], 0)
+
+    def test_reset(self):
+        histogram = PhaseHistogram()
+        histogram(sender=UserOpenID, phase='authenticate', duration=0.1,
+                  queries=1)
+        histogram.reset()
+        self.assertEqual(histogram.snapshot(), {})
+
+    def test_connects_as_receiver(self):
+        histogram = PhaseHistogram()
+        openid_login_phase.connect(histogram, sender=UserOpenID)
+        self.addCleanup(openid_login_phase.disconnect, histogram,
+                        sender=UserOpenID)
+
+        with login_phase('authenticate'):
+            pass
+
+        self.assertEqual(histogram.snapshot()['authenticate']['count'], 1)
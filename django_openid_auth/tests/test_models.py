@@ -29,11 +29,16 @@
 from __future__ import unicode_literals
 
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
 
 from django_openid_auth.models import (
+    Association,
+    Nonce,
     Permission,
     UserOpenID,
+    clear_account_verified_permission_id,
+    get_account_verified_permission_id,
 )
 
 
@@ -72,3 +77,53 @@ class UserOpenIDModelTestCase(TestCase):
         self.assertFalse(
             User.objects.get(username='someuser').has_perm(
                 'django_openid_auth.account_verified'))
+
+
+class AccountVerifiedPermissionTestCase(TestCase):
+
+    def setUp(self):
+        super(AccountVerifiedPermissionTestCase, self).setUp()
+        clear_account_verified_permission_id()
+        self.addCleanup(clear_account_verified_permission_id)
+
+    def test_permission_id_cached(self):
+        permission = Permission.objects.get(codename='account_verified')
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_account_verified_permission_id(), permission.id)
+            self.assertEqual(
+                get_account_verified_permission_id(), permission.id)
+
+    def test_permission_id_cleared_on_delete(self):
+        permission = Permission.objects.get(codename='account_verified')
+        get_account_verified_permission_id()
+        content_type = permission.content_type
+        permission.delete()
+        new_permission = Permission.objects.create(
+            codename='account_verified', content_type=content_type,
+            name='The OpenID has been verified')
+        self.assertEqual(
+            get_account_verified_permission_id(), new_permission.id)
+
+
+class LookupIndexesTestCase(TestCase):
+
+    def get_indexed_columns(self, model):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table)
+        return [tuple(constraint['columns'])
+                for constraint in constraints.values()
+                if constraint['index'] or constraint['unique']]
+
+    def test_association_indexes(self):
+        self.assertIn(('server_url_hash', 'handle'),
+                      self.get_indexed_columns(Association))
+
+    def test_nonce_indexes(self):
+        indexed = self.get_indexed_columns(Nonce)
+        self.assertIn(('timestamp',), indexed)
+        self.assertIn(('server_url', 'timestamp', 'salt'), indexed)
+
+    def test_useropenid_indexes(self):
+        self.assertIn(('claimed_id',), self.get_indexed_columns(UserOpenID))
@@ -0,0 +1,124 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import unicode_literals
+
+from django.db import connection, migrations
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+from mock import patch
+
+from django_openid_auth.schema import AlterPrefixUniqueTogether
+
+
+class AlterPrefixUniqueTogetherTests(TestCase):
+
+    def setUp(self):
+        super(AlterPrefixUniqueTogetherTests, self).setUp()
+        loader = MigrationLoader(connection)
+        self.from_state = loader.project_state(
+            ('django_openid_auth', '0001_initial'))
+        self.operation = AlterPrefixUniqueTogether(
+            name='nonce',
+            unique_together=set([('server_url', 'timestamp', 'salt')]))
+        self.to_state = self.from_state.clone()
+        self.operation.state_forwards('django_openid_auth', self.to_state)
+
+    def collect_sql(self, vendor):
+        editor = connection.SchemaEditorClass(connection, collect_sql=True)
+        with patch.object(connection, 'vendor', vendor):
+            self.operation.database_forwards(
+                'django_openid_auth', editor, self.from_state, self.to_state)
+        return editor.collected_sql
+
+    def test_mysql_uses_prefix(self):
+        statements = self.collect_sql('mysql')
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('CREATE UNIQUE INDEX'))
+        self.assertIn('"server_url"(255), "timestamp", "salt"', statements[0])
+
+    def test_other_databases_use_whole_columns(self):
+        statements = self.collect_sql(connection.vendor)
+        self.assertTrue(statements)
+        self.assertNotIn('(255)', ' '.join(statements))
+
+
+class AssociationUniqueTogetherMigrationTests(TestCase):
+
+    def test_mysql_index_kept_until_constraint_exists(self):
+        loader = MigrationLoader(connection)
+        migration = loader.get_migration(
+            'django_openid_auth', '0005_association_unique_together')
+        state = loader.project_state(
+            ('django_openid_auth', '0004_association_binary_secret'))
+        editor = connection.SchemaEditorClass(connection, collect_sql=True)
+        with patch.object(connection, 'vendor', 'mysql'):
+            for operation in migration.operations:
+                if isinstance(operation, migrations.RunPython):
+                    continue
+                new_state = state.clone()
+                operation.state_forwards('django_openid_auth', new_state)
+                operation.database_forwards(
+                    'django_openid_auth', editor, state, new_state)
+                state = new_state
+
+        statements = editor.collected_sql
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(statements[0].startswith('CREATE UNIQUE INDEX'))
+        self.assertIn('"server_url"(255), "handle"', statements[0])
+        self.assertTrue(statements[1].startswith('DROP INDEX'))
+        self.assertIn('openid_assoc_url_handle_idx', statements[1])
+
+
+class AssociationServerURLHashMigrationTests(TestCase):
+
+    def test_mysql_constraint_covers_whole_key(self):
+        loader = MigrationLoader(connection)
+        migration = loader.get_migration(
+            'django_openid_auth', '0006_association_server_url_hash')
+        from_state = loader.project_state(
+            ('django_openid_auth', '0005_association_unique_together'))
+        for operation in migration.operations[:-1]:
+            operation.state_forwards('django_openid_auth', from_state)
+        operation = migration.operations[-1]
+        to_state = from_state.clone()
+        operation.state_forwards('django_openid_auth', to_state)
+        editor = connection.SchemaEditorClass(connection, collect_sql=True)
+        with patch.object(connection, 'vendor', 'mysql'), patch.object(
+                editor, '_delete_composed_index') as delete_index:
+            operation.database_forwards(
+                'django_openid_auth', editor, from_state, to_state)
+
+        delete_index.assert_called_once()
+        self.assertEqual(
+            delete_index.call_args[0][1], ('server_url', 'handle'))
+        statements = editor.collected_sql
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('CREATE UNIQUE INDEX'))
+        self.assertIn('"server_url_hash", "handle"', statements[0])
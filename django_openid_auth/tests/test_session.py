@@ -0,0 +1,127 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import unicode_literals
+
+import json
+import pickle
+
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.test import TestCase
+from openid.consumer.consumer import Consumer
+from openid.consumer.discover import (
+    OPENID_2_0_TYPE,
+    OPENID_IDP_2_0_TYPE,
+    OpenIDServiceEndpoint,
+)
+from openid.yadis.manager import Discovery
+
+from django_openid_auth.session import ConsumerSession
+
+
+def make_endpoint(claimed_id=None, type_uri=OPENID_2_0_TYPE):
+    endpoint = OpenIDServiceEndpoint()
+    endpoint.claimed_id = claimed_id
+    endpoint.local_id = claimed_id
+    endpoint.server_url = 'http://example.com/openid/+openid'
+    endpoint.type_uris = [type_uri]
+    endpoint.used_yadis = True
+    return endpoint
+
+
+class ConsumerSessionTests(TestCase):
+
+    token_key = Consumer.session_key_prefix + Consumer._token
+
+    def setUp(self):
+        super(ConsumerSessionTests, self).setUp()
+        self.django_session = SessionStore()
+        self.session = ConsumerSession(self.django_session)
+
+    def assertEndpointsEqual(self, first, second):
+        self.assertIsInstance(first, OpenIDServiceEndpoint)
+        self.assertEqual(first.__dict__, second.__dict__)
+
+    def test_endpoint_round_trip(self):
+        endpoint = make_endpoint('http://example.com/identity')
+        endpoint.display_identifier = 'example.com/identity'
+        self.session[self.token_key] = endpoint
+
+        self.assertEndpointsEqual(self.session[self.token_key], endpoint)
+        self.assertEqual(json.loads(json.dumps(
+            self.django_session['OPENID']))[self.token_key], {
+                'endpoint': {
+                    'claimed_id': 'http://example.com/identity',
+                    'local_id': 'http://example.com/identity',
+                    'server_url': 'http://example.com/openid/+openid',
+                    'type_uris': [OPENID_2_0_TYPE],
+                    'display_identifier': 'example.com/identity',
+                    'used_yadis': True,
+                },
+            })
+
+    def test_service_manager_round_trip(self):
+        services = [
+            make_endpoint(type_uri=OPENID_IDP_2_0_TYPE),
+            make_endpoint('http://example.com/identity')]
+        discovery = Discovery(
+            self.session, 'http://example.com/', Consumer.session_key_prefix)
+        service = discovery.getNextService(
+            lambda url: ('http://example.com/', services))
+        self.assertIs(service, services[0])
+
+        manager = discovery.getManager()
+        self.assertEndpointsEqual(manager.current(), services[0])
+        self.assertEqual(len(manager), 1)
+        self.assertEndpointsEqual(manager.services[0], services[1])
+        json.dumps(self.django_session['OPENID'])
+
+        self.assertEndpointsEqual(discovery.cleanup(force=True), services[0])
+        self.assertNotIn('OPENID', self.django_session)
+
+    def test_marks_session_modified(self):
+        self.session[self.token_key] = make_endpoint()
+        self.assertTrue(self.django_session.modified)
+        self.django_session.modified = False
+
+        del self.session[self.token_key]
+        self.assertTrue(self.django_session.modified)
+        self.assertEqual(len(self.session), 0)
+
+    def test_pickled_value_returned_unchanged(self):
+        endpoint = make_endpoint('http://example.com/identity')
+        self.django_session['OPENID'] = {self.token_key: endpoint}
+        self.assertIs(self.session[self.token_key], endpoint)
+
+    def test_smaller_than_pickled_state(self):
+        endpoint = make_endpoint('http://example.com/identity')
+        self.session[self.token_key] = endpoint
+        self.assertLess(
+            len(json.dumps(self.django_session['OPENID'])),
+            len(pickle.dumps({self.token_key: endpoint})))
@@ -28,16 +28,31 @@
 
 from __future__ import unicode_literals
 
-import base64
 import time
+from importlib import import_module
+from unittest import skipIf
 
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection
+from django.db.backends.utils import CursorWrapper
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from mock import patch
+from django.test.utils import override_settings
 from openid.association import Association as OIDAssociation
 from openid.store.nonce import SKEW
 
-from django_openid_auth import PY3
 from django_openid_auth.models import Association, Nonce
-from django_openid_auth.store import DjangoOpenIDStore
+from django_openid_auth.store import (
+    AssociationCache,
+    BucketedNonceStore,
+    CacheOpenIDStore,
+    DjangoOpenIDStore,
+    RecentNonceCache,
+    get_store,
+    upsert_association_sql,
+)
 
 
 class OpenIDStoreTests(TestCase):
@@ -54,18 +69,33 @@ class OpenIDStoreTests(TestCase):
             server_url='server-url', handle='handle')
         self.assertEquals(dbassoc.server_url, 'server-url')
         self.assertEquals(dbassoc.handle, 'handle')
-        if isinstance(dbassoc.secret, str) and not dbassoc.secret.startswith("b'"):
-            dbassoc.secret = bytes(dbassoc.secret, 'utf-8')
-        if PY3:
-            self.assertEquals(
-                '%s' % dbassoc.secret, '%s' % base64.b64encode(b'secret'))
-        else:
-            self.assertEquals(
-                '%s' % dbassoc.secret, '%s' % base64.encodestring(b'secret'))
+        self.assertEquals(bytes(dbassoc.secret), b'secret')
         self.assertEquals(dbassoc.issued, 42)
         self.assertEquals(dbassoc.lifetime, 600)
         self.assertEquals(dbassoc.assoc_type, 'HMAC-SHA1')
 
+    def test_storeAssociation_secret_round_trip(self):
+        secret = bytes(bytearray(range(256)))[:32]
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', secret, int(time.time()),
+                                         600, 'HMAC-SHA256'))
+        self.store.association_cache.clear()
+
+        assoc = self.store.getAssociation('server-url', 'handle')
+        self.assertEqual(assoc.secret, secret)
+
+    def test_migration_decodes_text_secrets(self):
+        migration = import_module(
+            'django_openid_auth.migrations.0004_association_binary_secret')
+        # Python 2 stored the base64 text, Python 3 the repr of its bytes.
+        self.assertEqual(
+            migration.decode_secret('c2VjcmV0\n'), b'secret')
+        self.assertEqual(
+            migration.decode_secret("b'c2VjcmV0'"), b'secret')
+        self.assertEqual(
+            migration.decode_secret("b'c2VjcmV0\\n'"), b'secret')
+        self.assertIsNone(migration.decode_secret('c2Vjc'))
+
     def test_storeAssociation_update_existing(self):
         assoc = OIDAssociation('handle', 'secret', 42, 600, 'HMAC-SHA1')
         self.store.storeAssociation('server-url', assoc)
@@ -75,18 +105,101 @@ class OpenIDStoreTests(TestCase):
         self.store.storeAssociation('server-url', assoc)
         dbassoc = Association.objects.get(
             server_url='server-url', handle='handle')
-        if isinstance(dbassoc.secret, str) and not dbassoc.secret.startswith("b'"):
-            dbassoc.secret = bytes(dbassoc.secret, 'utf-8')
-        if PY3:
-            self.assertEqual(
-                '%s' % dbassoc.secret, '%s' % base64.b64encode(b'secret2'))
-        else:
-            self.assertEqual(
-                '%s' % dbassoc.secret, '%s' % base64.encodestring(b'secret2'))
+        self.assertEqual(bytes(dbassoc.secret), b'secret2')
         self.assertEqual(dbassoc.issued, 420)
         self.assertEqual(dbassoc.lifetime, 900)
         self.assertEqual(dbassoc.assoc_type, 'HMAC-SHA256')
 
+    def test_storeAssociation_single_row_per_handle(self):
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', 42, 600,
+                                         'HMAC-SHA1'))
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret2', 420, 900,
+                                         'HMAC-SHA256'))
+        self.assertEqual(Association.objects.filter(
+            server_url='server-url', handle='handle').count(), 1)
+        self.assertRaises(
+            IntegrityError, Association.objects.create,
+            server_url='server-url', handle='handle', secret=b'secret',
+            issued=42, lifetime=600, assoc_type='HMAC-SHA1')
+
+    def test_storeAssociation_long_urls_with_common_prefix(self):
+        # MySQL could only index the first 255 characters of the URL.
+        prefix = 'https://example.com/' + 'x' * 255
+        self.store.storeAssociation(
+            prefix + '/one', OIDAssociation('handle', 'secret1', 42, 600,
+                                            'HMAC-SHA1'))
+        self.store.storeAssociation(
+            prefix + '/two', OIDAssociation('handle', 'secret2', 42, 600,
+                                            'HMAC-SHA1'))
+
+        self.assertEqual(
+            sorted((assoc.server_url, bytes(assoc.secret))
+                   for assoc in Association.objects.all()),
+            [(prefix + '/one', b'secret1'), (prefix + '/two', b'secret2')])
+        self.store.association_cache.clear()
+        with patch('time.time', return_value=100):
+            self.assertEqual(self.store.getAssociation(
+                prefix + '/one', 'handle').secret, b'secret1')
+            self.assertEqual(self.store.getAssociation(
+                prefix + '/two', 'handle').secret, b'secret2')
+
+    def test_storeAssociation_does_not_select(self):
+        with CaptureQueriesContext(connection) as context:
+            for secret in ('secret', 'secret2'):
+                self.store.storeAssociation(
+                    'server-url', OIDAssociation('handle', secret, 42, 600,
+                                                 'HMAC-SHA1'))
+        statements = [
+            query['sql'].upper() for query in context.captured_queries]
+        self.assertFalse(
+            [sql for sql in statements if sql.startswith('SELECT')])
+
+    def test_storeAssociation_single_statement(self):
+        # Both for a new row and for one that is already stored.
+        for secret in ('secret', 'secret2'):
+            with CaptureQueriesContext(connection) as context:
+                self.store.storeAssociation(
+                    'server-url', OIDAssociation('handle', secret, 42, 600,
+                                                 'HMAC-SHA1'))
+            self.assertEqual(len(context.captured_queries), 1)
+            self.assertTrue(context.captured_queries[0]['sql'].startswith(
+                'INSERT'))
+        self.assertEqual(
+            bytes(Association.objects.get(handle='handle').secret),
+            b'secret2')
+
+    def test_upsert_association_sql(self):
+        with patch.object(connection, 'vendor', 'mysql'):
+            self.assertIn(
+                'ON DUPLICATE KEY UPDATE "secret" = VALUES("secret")',
+                upsert_association_sql(connection))
+        with patch.object(connection, 'vendor', 'postgresql'):
+            self.assertIn(
+                'ON CONFLICT ("server_url_hash", "handle") DO UPDATE SET '
+                '"secret" = EXCLUDED."secret"',
+                upsert_association_sql(connection))
+        with patch.object(connection, 'vendor', 'oracle'):
+            self.assertIsNone(upsert_association_sql(connection))
+
+    @skipIf(connection.vendor != 'sqlite', 'needs SQLite')
+    def test_upsert_association_sql_old_sqlite(self):
+        with patch.object(
+                connection.Database, 'sqlite_version_info', (3, 23, 1)):
+            self.assertIsNone(upsert_association_sql(connection))
+
+    def test_storeAssociation_without_upsert(self):
+        with patch('django_openid_auth.store.upsert_association_sql',
+                   return_value=None):
+            for secret in ('secret', 'secret2'):
+                self.store.storeAssociation(
+                    'server-url', OIDAssociation('handle', secret, 42, 600,
+                                                 'HMAC-SHA1'))
+        self.assertEqual(
+            bytes(Association.objects.get(handle='handle').secret),
+            b'secret2')
+
     def test_getAssociation(self):
         timestamp = int(time.time())
         self.store.storeAssociation(
@@ -112,11 +225,35 @@ class OpenIDStoreTests(TestCase):
             'server-url', OIDAssociation('handle', 'secret', timestamp,
                                          lifetime, 'HMAC-SHA1'))
 
-        # The association is not returned, and is removed from the database.
+        # The association is not returned, and is left in the database
+        # for cleanupAssociations() to remove.
         assoc = self.store.getAssociation('server-url', 'handle')
         self.assertEquals(assoc, None)
-        self.assertRaises(Association.DoesNotExist, Association.objects.get,
-                          server_url='server-url', handle='handle')
+        self.assertTrue(Association.objects.filter(
+            server_url='server-url', handle='handle').exists())
+        self.assertEquals(self.store.cleanupAssociations(), 1)
+
+    def test_getAssociation_single_query(self):
+        timestamp = int(time.time())
+        for i in range(3):
+            self.store.storeAssociation(
+                'server-url', OIDAssociation('handle%d' % i, 'secret',
+                                             timestamp - i, 600, 'HMAC-SHA1'))
+        with self.assertNumQueries(1):
+            assoc = self.store.getAssociation('server-url')
+        self.assertEquals(assoc.handle, 'handle0')
+
+    def test_getAssociation_skips_expired_newer(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('valid', 'secret', timestamp - 100,
+                                         600, 'HMAC-SHA1'))
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('expired', 'secret', timestamp - 50,
+                                         10, 'HMAC-SHA1'))
+
+        assoc = self.store.getAssociation('server-url')
+        self.assertEquals(assoc.handle, 'valid')
 
     def test_getAssociation_no_handle(self):
         timestamp = int(time.time())
@@ -163,6 +300,26 @@ class OpenIDStoreTests(TestCase):
         self.assertEqual(
             self.store.useNonce('server-url', timestamp, 'salt'), False)
 
+    def test_useNonce_existing_row(self):
+        timestamp = int(time.time())
+        Nonce.objects.create(
+            server_url='server-url', timestamp=timestamp, salt='salt')
+        self.assertEqual(
+            self.store.useNonce('server-url', timestamp, 'salt'), False)
+        self.assertEqual(Nonce.objects.count(), 1)
+
+    def test_useNonce_does_not_select(self):
+        timestamp = time.time()
+        with CaptureQueriesContext(connection) as context:
+            self.store.useNonce('server-url', timestamp, 'salt')
+            self.store.useNonce('server-url', timestamp, 'salt')
+        statements = [
+            query['sql'].upper() for query in context.captured_queries]
+        self.assertFalse(
+            [sql for sql in statements if sql.startswith('SELECT')])
+        self.assertEqual(
+            len([sql for sql in statements if sql.startswith('INSERT')]), 2)
+
     def test_useNonce_future(self):
         timestamp = time.time() + 2 * SKEW
         self.assertEqual(
@@ -190,6 +347,59 @@ class OpenIDStoreTests(TestCase):
         self.assertEqual(
             self.store.cleanupNonces(_now=timestamp + 2 * SKEW), 0)
 
+    def test_cleanupNonces_in_batches(self):
+        timestamp = time.time()
+        for i in range(5):
+            self.store.useNonce('server-url', timestamp, 'salt%d' % i)
+        Nonce.objects.create(
+            server_url='server-url', timestamp=timestamp + 2 * SKEW,
+            salt='fresh')
+
+        batches = list(self.store.cleanupNoncesInBatches(
+            2, _now=timestamp + 2 * SKEW))
+        self.assertEqual([batch.deleted for batch in batches], [2, 2, 1])
+        self.assertEqual(
+            list(Nonce.objects.values_list('salt', flat=True)), ['fresh'])
+
+    @override_settings(OPENID_CLEANUP_BATCH_SIZE=2)
+    def test_cleanupNonces_batch_size_setting(self):
+        timestamp = time.time()
+        for i in range(3):
+            self.store.useNonce('server-url', timestamp, 'salt%d' % i)
+
+        with self.assertNumQueries(4):
+            # Two batches, each a SELECT of primary keys and a DELETE.
+            self.assertEqual(
+                self.store.cleanupNonces(_now=timestamp + 2 * SKEW), 3)
+        self.assertEqual(Nonce.objects.count(), 0)
+
+    @patch('django_openid_auth.store.time.sleep')
+    def test_cleanupNonces_pause_between_batches(self, mock_sleep):
+        timestamp = time.time()
+        for i in range(3):
+            self.store.useNonce('server-url', timestamp, 'salt%d' % i)
+
+        self.assertEqual(self.store.cleanupNonces(
+            _now=timestamp + 2 * SKEW, batch_size=2, pause=0.5), 3)
+        mock_sleep.assert_called_once_with(0.5)
+
+    def test_cleanupAssociations_in_batches(self):
+        timestamp = int(time.time()) - 100
+        for i in range(3):
+            self.store.storeAssociation(
+                'server-url', OIDAssociation('handle%d' % i, 'secret',
+                                             timestamp, 50, 'HMAC-SHA1'))
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('live', 'secret', timestamp,
+                                         200, 'HMAC-SHA1'))
+
+        batches = list(self.store.cleanupAssociationsInBatches(2))
+        self.assertEqual([batch.deleted for batch in batches], [2, 1])
+        self.assertEqual(
+            list(Association.objects.values_list('handle', flat=True)),
+            ['live'])
+        self.assertEqual(self.store.cleanupAssociations(batch_size=2), 0)
+
     def test_cleanupAssociations(self):
         timestamp = int(time.time()) - 100
         self.store.storeAssociation(
@@ -204,3 +414,413 @@ class OpenIDStoreTests(TestCase):
         # The second (non-expired) association is left behind.
         self.assertNotEqual(self.store.getAssociation('server-url', 'handle2'),
                             None)
+
+
+@override_settings(OPENID_ASSOCIATION_CACHE_SIZE=10)
+class AssociationCacheTests(TestCase):
+
+    def setUp(self):
+        super(AssociationCacheTests, self).setUp()
+        self.store = DjangoOpenIDStore()
+        self.store.association_cache.clear()
+        self.addCleanup(self.store.association_cache.clear)
+
+    def test_getAssociation_cached(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', timestamp, 600,
+                                         'HMAC-SHA1'))
+        assoc = self.store.getAssociation('server-url', 'handle')
+
+        with self.assertNumQueries(0):
+            cached = self.store.getAssociation('server-url', 'handle')
+        self.assertIs(cached, assoc)
+
+    def test_getAssociation_cache_disabled(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', timestamp, 600,
+                                         'HMAC-SHA1'))
+        with override_settings(OPENID_ASSOCIATION_CACHE_SIZE=0):
+            self.store.getAssociation('server-url', 'handle')
+            with self.assertNumQueries(1):
+                self.store.getAssociation('server-url', 'handle')
+
+    def test_storeAssociation_invalidates(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', timestamp, 600,
+                                         'HMAC-SHA1'))
+        self.store.getAssociation('server-url', 'handle')
+        self.store.getAssociation('server-url')
+
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret2', timestamp, 900,
+                                         'HMAC-SHA1'))
+        assoc = self.store.getAssociation('server-url', 'handle')
+        self.assertEqual(assoc.secret, b'secret2')
+        self.assertEqual(assoc.lifetime, 900)
+        self.assertEqual(
+            self.store.getAssociation('server-url').lifetime, 900)
+
+    def test_removeAssociation_invalidates(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', timestamp, 600,
+                                         'HMAC-SHA1'))
+        self.store.getAssociation('server-url', 'handle')
+        self.store.getAssociation('server-url')
+
+        self.assertTrue(self.store.removeAssociation('server-url', 'handle'))
+        self.assertIsNone(self.store.getAssociation('server-url', 'handle'))
+        self.assertIsNone(self.store.getAssociation('server-url'))
+
+    def test_cache_entry_expires_with_association(self):
+        cache = AssociationCache(max_size=10)
+        assoc = OIDAssociation(
+            'handle', 'secret', int(time.time()) - 600, 300, 'HMAC-SHA1')
+        cache.set('server-url', 'handle', assoc)
+        self.assertIsNone(cache.get('server-url', 'handle'))
+
+    @override_settings(OPENID_ASSOCIATION_RENEW_BEFORE=60)
+    def test_newest_association_expires_before_renewal(self):
+        cache = AssociationCache(max_size=10)
+        assoc = OIDAssociation(
+            'handle', 'secret', int(time.time()), 3600, 'HMAC-SHA1')
+        cache.set('server-url', None, assoc)
+        cache.set('server-url', 'handle', assoc)
+
+        with patch('time.time', return_value=time.time() + 120):
+            self.assertIsNone(cache.get('server-url', None))
+            self.assertIs(cache.get('server-url', 'handle'), assoc)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = AssociationCache(max_size=2)
+        timestamp = int(time.time())
+        assocs = [
+            OIDAssociation('handle%d' % i, 'secret', timestamp, 600,
+                           'HMAC-SHA1')
+            for i in range(3)]
+        cache.set('server-url', 'handle0', assocs[0])
+        cache.set('server-url', 'handle1', assocs[1])
+        # Touch handle0 so that handle1 becomes the eviction candidate.
+        cache.get('server-url', 'handle0')
+        cache.set('server-url', 'handle2', assocs[2])
+
+        self.assertIs(cache.get('server-url', 'handle0'), assocs[0])
+        self.assertIsNone(cache.get('server-url', 'handle1'))
+        self.assertIs(cache.get('server-url', 'handle2'), assocs[2])
+
+
+@override_settings(OPENID_NONCE_CACHE_SIZE=10)
+class RecentNonceCacheTests(TestCase):
+
+    def setUp(self):
+        super(RecentNonceCacheTests, self).setUp()
+        self.store = DjangoOpenIDStore()
+        self.store.nonce_cache.clear()
+        self.addCleanup(self.store.nonce_cache.clear)
+
+    def test_useNonce_replay_rejected_in_memory(self):
+        timestamp = int(time.time())
+        self.assertTrue(self.store.useNonce('server-url', timestamp, 'salt'))
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                self.store.useNonce('server-url', timestamp, 'salt'))
+        self.assertEqual(self.store.nonce_cache.hits, 1)
+        self.assertEqual(self.store.nonce_cache.misses, 1)
+
+    def test_useNonce_used_by_other_process(self):
+        timestamp = int(time.time())
+        Nonce.objects.create(
+            server_url='server-url', timestamp=timestamp, salt='salt')
+        self.assertFalse(self.store.useNonce('server-url', timestamp, 'salt'))
+        self.assertEqual(self.store.nonce_cache.misses, 1)
+
+        # The store's answer is remembered as well.
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                self.store.useNonce('server-url', timestamp, 'salt'))
+
+    def test_useNonce_cache_disabled(self):
+        timestamp = int(time.time())
+        with override_settings(OPENID_NONCE_CACHE_SIZE=0):
+            self.store.useNonce('server-url', timestamp, 'salt')
+            self.assertFalse(
+                self.store.useNonce('server-url', timestamp, 'salt'))
+        self.assertEqual(len(self.store.nonce_cache), 0)
+        self.assertEqual(self.store.nonce_cache.misses, 0)
+
+    def test_max_size(self):
+        cache = RecentNonceCache(max_size=2)
+        timestamp = int(time.time())
+        for salt in ('salt1', 'salt2', 'salt3'):
+            cache.add('server-url', timestamp, salt)
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(cache.seen('server-url', timestamp, 'salt1'))
+        self.assertTrue(cache.seen('server-url', timestamp, 'salt3'))
+
+    def test_expired_nonces_forgotten(self):
+        cache = RecentNonceCache()
+        timestamp = int(time.time())
+        cache.add('server-url', timestamp - 2 * SKEW, 'old')
+        cache.add('server-url', timestamp, 'new')
+        self.assertEqual(len(cache), 1)
+        self.assertFalse(cache.seen('server-url', timestamp - 2 * SKEW, 'old'))
+
+    def test_bucketed_store(self):
+        self.addCleanup(BucketedNonceStore._created_buckets.clear)
+        store = BucketedNonceStore()
+        timestamp = int(time.time())
+        self.assertTrue(store.useNonce('server-url', timestamp, 'salt'))
+        with self.assertNumQueries(0):
+            self.assertFalse(store.useNonce('server-url', timestamp, 'salt'))
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    OPENID_STORE_CACHE_ALIAS='default')
+class CacheOpenIDStoreTests(TestCase):
+
+    def setUp(self):
+        super(CacheOpenIDStoreTests, self).setUp()
+        self.store = CacheOpenIDStore()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+    def test_getAssociation(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', timestamp, 600,
+                                         'HMAC-SHA1'))
+        assoc = self.store.getAssociation('server-url', 'handle')
+        self.assertTrue(isinstance(assoc, OIDAssociation))
+
+        self.assertEquals(assoc.handle, 'handle')
+        self.assertEquals(assoc.secret, b'secret')
+        self.assertEquals(assoc.issued, timestamp)
+        self.assertEquals(assoc.lifetime, 600)
+        self.assertEquals(assoc.assoc_type, 'HMAC-SHA1')
+
+    def test_getAssociation_unknown(self):
+        self.assertEquals(
+            self.store.getAssociation('server-url', 'unknown'), None)
+
+    def test_getAssociation_expired(self):
+        lifetime = 600
+        timestamp = int(time.time()) - 2 * lifetime
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', timestamp,
+                                         lifetime, 'HMAC-SHA1'))
+        self.assertEquals(
+            self.store.getAssociation('server-url', 'handle'), None)
+
+    def test_getAssociation_no_handle(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle1', 'secret', timestamp + 1,
+                                         600, 'HMAC-SHA1'))
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle2', 'secret', timestamp,
+                                         600, 'HMAC-SHA1'))
+
+        # The newest handle is returned.
+        assoc = self.store.getAssociation('server-url', None)
+        self.assertEquals(assoc.handle, 'handle1')
+        self.assertEquals(assoc.issued, timestamp + 1)
+
+    def test_storeAssociation_update_existing(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', timestamp, 600,
+                                         'HMAC-SHA1'))
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret2', timestamp, 900,
+                                         'HMAC-SHA256'))
+        assoc = self.store.getAssociation('server-url', 'handle')
+        self.assertEqual(assoc.secret, b'secret2')
+        self.assertEqual(assoc.lifetime, 900)
+        self.assertEqual(assoc.assoc_type, 'HMAC-SHA256')
+
+    def test_removeAssociation(self):
+        timestamp = int(time.time())
+        self.store.storeAssociation(
+            'server-url', OIDAssociation('handle', 'secret', timestamp, 600,
+                                         'HMAC-SHA1'))
+        self.assertEquals(
+            self.store.removeAssociation('server-url', 'handle'), True)
+        self.assertEquals(
+            self.store.getAssociation('server-url', 'handle'), None)
+        self.assertEquals(self.store.getAssociation('server-url'), None)
+
+    def test_removeAssociation_unknown(self):
+        self.assertEquals(
+            self.store.removeAssociation('server-url', 'unknown'), False)
+
+    def test_useNonce(self):
+        timestamp = time.time()
+        # The nonce can only be used once.
+        self.assertEqual(
+            self.store.useNonce('server-url', timestamp, 'salt'), True)
+        self.assertEqual(
+            self.store.useNonce('server-url', timestamp, 'salt'), False)
+        self.assertEqual(
+            self.store.useNonce('server-url', timestamp, 'other'), True)
+
+    def test_useNonce_expired(self):
+        timestamp = time.time() - 2 * SKEW
+        self.assertEqual(
+            self.store.useNonce('server-url', timestamp, 'salt'), False)
+
+    def test_useNonce_future(self):
+        timestamp = time.time() + 2 * SKEW
+        self.assertEqual(
+            self.store.useNonce('server-url', timestamp, 'salt'), False)
+
+    def test_does_not_touch_database(self):
+        timestamp = int(time.time())
+        with self.assertNumQueries(0):
+            self.store.storeAssociation(
+                'server-url', OIDAssociation('handle', 'secret', timestamp,
+                                             600, 'HMAC-SHA1'))
+            self.store.getAssociation('server-url')
+            self.store.useNonce('server-url', timestamp, 'salt')
+            self.store.cleanup()
+
+
+class BucketedNonceStoreTests(TestCase):
+
+    def setUp(self):
+        super(BucketedNonceStoreTests, self).setUp()
+        self.store = BucketedNonceStore()
+        self.addCleanup(BucketedNonceStore._created_buckets.clear)
+
+    def bucket_tables(self):
+        return [
+            self.store._bucket_table(bucket)
+            for bucket in self.store._buckets(connection)]
+
+    def test_useNonce(self):
+        timestamp = time.time()
+        self.assertTrue(self.store.useNonce('server-url', timestamp, 'salt'))
+        self.assertFalse(self.store.useNonce('server-url', timestamp, 'salt'))
+        self.assertTrue(self.store.useNonce('server-url', timestamp, 'salt2'))
+        self.assertEqual(Nonce.objects.count(), 0)
+
+    def test_useNonce_expired(self):
+        self.assertFalse(self.store.useNonce(
+            'server-url', time.time() - 2 * SKEW, 'salt'))
+        self.assertEqual(self.bucket_tables(), [])
+
+    def test_mysql_not_supported(self):
+        with patch.object(connection, 'vendor', 'mysql'):
+            self.assertRaises(ImproperlyConfigured, BucketedNonceStore)
+
+    def test_useNonce_one_table_per_window(self):
+        timestamp = int(time.time()) // SKEW * SKEW
+        self.store.useNonce('server-url', timestamp - 1, 'salt')
+        self.store.useNonce('server-url', timestamp, 'salt')
+        self.store.useNonce('server-url', timestamp + 1, 'salt')
+        self.assertEqual(self.bucket_tables(), [
+            self.store._bucket_table(timestamp // SKEW - 1),
+            self.store._bucket_table(timestamp // SKEW),
+        ])
+
+    def test_useNonce_recreates_missing_table(self):
+        timestamp = time.time()
+        bucket = self.store._bucket(timestamp)
+        BucketedNonceStore._created_buckets.add((connection.alias, bucket))
+        self.assertTrue(self.store.useNonce('server-url', timestamp, 'salt'))
+        self.assertFalse(self.store.useNonce('server-url', timestamp, 'salt'))
+
+    def test_createBuckets(self):
+        now = int(time.time()) // SKEW * SKEW
+        self.store.createBuckets(_now=now)
+        self.assertEqual(self.bucket_tables(), [
+            self.store._bucket_table(now // SKEW + i) for i in range(3)])
+
+        # Logins in another process find the tables without creating them.
+        BucketedNonceStore._created_buckets.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(self.store.useNonce('server-url', now, 'salt'))
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].upper().startswith('CREATE')])
+
+    def test_useNonce_loses_race_to_create_table(self):
+        execute = CursorWrapper.execute
+        failures = []
+
+        def fail_first_create(cursor, sql, params=None):
+            if sql.startswith('CREATE') and not failures:
+                # Another process created the table concurrently.
+                failures.append(sql)
+                execute(cursor, sql, params)
+                raise IntegrityError('duplicate key value')
+            return execute(cursor, sql, params)
+
+        with patch.object(CursorWrapper, 'execute', fail_first_create):
+            self.assertTrue(
+                self.store.useNonce('server-url', time.time(), 'salt'))
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(len(self.bucket_tables()), 1)
+
+    def test_cleanupNonces(self):
+        now = int(time.time())
+        for i in range(3):
+            self.store.useNonce('server-url', now, 'salt%d' % i)
+        Nonce.objects.create(
+            server_url='server-url', timestamp=now - 2 * SKEW, salt='old')
+
+        self.assertEqual(self.store.countExpiredNonces(), 1)
+        self.assertEqual(self.store.cleanupNonces(), 1)
+        self.assertEqual(len(self.bucket_tables()), 1)
+
+        later = now + 3 * SKEW
+        self.assertEqual(self.store.countExpiredNonces(_now=later), 3)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.store.cleanupNonces(_now=later), 3)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].upper().startswith('DELETE')])
+        self.assertEqual(self.bucket_tables(), [])
+
+        # Nonces can be used again once their table has been dropped.
+        self.assertTrue(self.store.useNonce('server-url', now, 'salt0'))
+
+    def test_cleanupNonces_keeps_live_windows(self):
+        now = int(time.time())
+        self.store.useNonce('server-url', now - SKEW + 1, 'salt')
+        self.assertEqual(self.store.cleanupNonces(_now=now), 0)
+        self.assertEqual(len(self.bucket_tables()), 1)
+
+    def test_cleanupNoncesInBatches(self):
+        now = int(time.time())
+        for i in range(3):
+            self.store.useNonce('server-url', now, 'salt%d' % i)
+        batches = list(self.store.cleanupNoncesInBatches(
+            2, _now=now + 3 * SKEW))
+        self.assertEqual([batch.deleted for batch in batches], [3])
+
+
+class GetStoreTests(TestCase):
+
+    def test_default_store(self):
+        self.assertIsInstance(get_store(), DjangoOpenIDStore)
+
+    @override_settings(OPENID_STORE_CLASS=CacheOpenIDStore)
+    def test_store_class(self):
+        self.assertIsInstance(get_store(), CacheOpenIDStore)
+
+    @override_settings(
+        OPENID_STORE_CLASS='django_openid_auth.store.CacheOpenIDStore')
+    def test_store_class_path(self):
+        self.assertIsInstance(get_store(), CacheOpenIDStore)
+
+    @override_settings(OPENID_STORE_CLASS='django_openid_auth.store.Missing')
+    def test_improperly_configured(self):
+        self.assertRaises(ImproperlyConfigured, get_store)
@@ -0,0 +1,105 @@
+# django-openid-auth -  OpenID integration for django.contrib.auth
+#
+# Copyright (C) 2026 Canonical Ltd.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from django_openid_auth.auth import OpenIDBackend
+from django_openid_auth.teams_mapping import (
+    get_mapping_version,
+    get_teams_mapping,
+    invalidate_teams_mapping,
+)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    OPENID_LAUNCHPAD_TEAMS_MAPPING={'team': 'group'},
+    OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO=True,
+    OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO_BLACKLIST=['blacklisted'])
+class TeamsMappingTests(TestCase):
+
+    def setUp(self):
+        super(TeamsMappingTests, self).setUp()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        Group.objects.create(name='group1')
+        Group.objects.create(name='blacklisted')
+
+    def test_auto_mapping(self):
+        self.assertEqual(get_teams_mapping(), {'group1': 'group1'})
+
+    @override_settings(OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO=False)
+    def test_explicit_mapping(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_teams_mapping(), {'team': 'group'})
+
+    def test_auto_mapping_cached(self):
+        get_teams_mapping()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_teams_mapping(), {'group1': 'group1'})
+            self.assertEqual(
+                OpenIDBackend().get_teams_mapping(), {'group1': 'group1'})
+
+    def test_group_save_invalidates(self):
+        get_teams_mapping()
+        group = Group.objects.create(name='group2')
+        self.assertEqual(
+            get_teams_mapping(), {'group1': 'group1', 'group2': 'group2'})
+
+        group.name = 'renamed'
+        group.save()
+        self.assertEqual(
+            get_teams_mapping(), {'group1': 'group1', 'renamed': 'renamed'})
+
+    def test_group_delete_invalidates(self):
+        get_teams_mapping()
+        Group.objects.get(name='group1').delete()
+        self.assertEqual(get_teams_mapping(), {})
+
+    def test_blacklist_change(self):
+        get_teams_mapping()
+        with self.settings(OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO_BLACKLIST=[]):
+            self.assertEqual(
+                get_teams_mapping(),
+                {'group1': 'group1', 'blacklisted': 'blacklisted'})
+
+    def test_invalidate_changes_version(self):
+        version = get_mapping_version()
+        self.assertEqual(get_mapping_version(), version)
+        invalidate_teams_mapping()
+        self.assertNotEqual(get_mapping_version(), version)
@@ -29,15 +29,14 @@
 
 from __future__ import unicode_literals
 
-import cgi
-
 try:
-    from urllib.parse import parse_qs
+    from urllib.parse import parse_qs, parse_qsl
 except ImportError:
-    from urlparse import parse_qs
+    from urlparse import parse_qs, parse_qsl
 
 from django.conf import settings
 from django.contrib.auth.models import User, Group, Permission
+from django.core.cache import caches
 
 try:
     from django.urls import reverse
@@ -60,6 +59,7 @@ from openid.store.memstore import MemoryStore
 from openid.message import IDENTIFIER_SELECT
 
 from django_openid_auth import teams
+from django_openid_auth.discovery import PrefetchedDiscovery
 from django_openid_auth.models import UserOpenID
 from django_openid_auth.tests.helpers import override_session_serializer
 from django_openid_auth.views import (
@@ -67,8 +67,11 @@ from django_openid_auth.views import (
     make_consumer,
     sanitise_redirect_url,
 )
-from django_openid_auth.signals import openid_login_complete
-from django_openid_auth.store import DjangoOpenIDStore
+from django_openid_auth.signals import (
+    openid_login_complete,
+    openid_login_phase,
+)
+from django_openid_auth.store import CacheOpenIDStore, DjangoOpenIDStore
 from django_openid_auth.exceptions import (
     MissingUsernameViolation,
     DuplicateUsernameViolation,
@@ -114,9 +117,9 @@ class StubOpenIDProvider(HTTPFetcher):
             # Gather query parameters
             query = {}
             if '?' in url:
-                query.update(cgi.parse_qsl(url.split('?', 1)[1]))
+                query.update(parse_qsl(url.split('?', 1)[1]))
             if body is not None:
-                query.update(cgi.parse_qsl(body))
+                query.update(parse_qsl(body))
             self.last_request = self.server.decodeRequest(query)
 
             # The browser based requests should not be handled through
@@ -226,7 +229,7 @@ class RelyingPartyTests(TestCase):
             'http://testserver/openid/complete/'))
         return self.client.get(
             reverse('openid-complete'),
-            dict(cgi.parse_qsl(redirect_to.split('?', 1)[1])))
+            dict(parse_qsl(redirect_to.split('?', 1)[1])))
 
     def test_login(self):
         user = User.objects.create_user('someuser', 'someone@example.com')
@@ -321,6 +324,21 @@ class RelyingPartyTests(TestCase):
         response = self.client.get('/getuser/')
         self.assertEqual(response.content.decode('utf-8'), 'someuser')
 
+    @override_settings(OPENID_DISCOVERY_CACHE_TIMEOUT=300)
+    def test_login_begin_uses_discovery_cache(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        with patch.object(
+                self.provider, 'fetch', wraps=self.provider.fetch) as fetch:
+            for i in range(3):
+                response = self.client.post(self.login_url, self.openid_req)
+                self.assertContains(
+                    response, 'OpenID transaction in progress')
+        identity_fetches = [
+            call for call in fetch.call_args_list
+            if call[0][0] == self.provider.identity_url]
+        self.assertEqual(len(identity_fetches), 1)
+
     def test_login_create_users(self):
         # Create a user with the same name as we'll pass back via sreg.
         User.objects.create_user('someuser', 'someone@example.com')
@@ -1268,6 +1286,47 @@ class RelyingPartyTests(TestCase):
         self.assertIn(group, user.groups.all())
         self.assertNotIn(ogroup, user.groups.all())
 
+    def test_login_complete_sends_phase_timings(self):
+        user = User.objects.create_user('testuser', 'someone@example.com')
+        Group.objects.create(name='groupname')
+        UserOpenID.objects.create(
+            user=user,
+            claimed_id='http://example.com/identity',
+            display_id='http://example.com/identity')
+        phases = []
+        requests = []
+
+        def receiver(sender, phase, duration, queries, request, **kwargs):
+            phases.append(phase)
+            requests.append(request)
+            self.assertGreaterEqual(duration, 0)
+            self.assertGreaterEqual(queries, 0)
+
+        openid_login_phase.connect(receiver, sender=UserOpenID)
+        self.addCleanup(
+            openid_login_phase.disconnect, receiver, sender=UserOpenID)
+
+        response = self.client.post(self.login_url, self.openid_req)
+        openid_request = self.provider.parseFormPost(
+            response.content.decode('utf-8'))
+        openid_response = openid_request.answer(True)
+        teams_request = teams.TeamsRequest.fromOpenIDRequest(openid_request)
+        openid_response.addExtension(teams.TeamsResponse.extractResponse(
+            teams_request, 'teamname'))
+        with self.settings(
+                OPENID_UPDATE_DETAILS_FROM_SREG=True,
+                OPENID_LAUNCHPAD_TEAMS_MAPPING={'teamname': 'groupname'},
+                OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO=False):
+            response = self.complete(openid_response)
+        self.assertRedirects(response, '/getuser/')
+
+        self.assertEqual(phases, [
+            'parse_openid_response', 'update_user_details', 'update_groups',
+            'authenticate', 'auth_login'])
+        # Every phase can be tied to the login it belongs to.
+        self.assertIsInstance(requests[0], HttpRequest)
+        self.assertEqual(requests, [requests[0]] * len(phases))
+
     def test_login_teams_automapping(self):
         user = User.objects.create_user('testuser', 'someone@example.com')
         group1 = Group(name='django-group1')
@@ -1437,3 +1496,25 @@ class HelperFunctionsTest(TestCase):
         data = get_request_data(request)
         self.assertEqual(dict(data), {'foo': ['42', 'bar']})
         self.assertEqual(data['foo'], 'bar')
+
+    def test_make_consumer_uses_default_store(self):
+        request = RequestFactory().get('/')
+        request.session = {}
+        consumer = make_consumer(request)
+        self.assertIsInstance(consumer.consumer.store, DjangoOpenIDStore)
+
+    def test_make_consumer_uses_prefetched_discovery(self):
+        request = RequestFactory().get('/')
+        request.session = {}
+        request.openid_discovery = PrefetchedDiscovery()
+        consumer = make_consumer(request)
+        self.assertIs(consumer._discover, request.openid_discovery)
+        self.assertIs(consumer.consumer._discover, request.openid_discovery)
+
+    @override_settings(
+        OPENID_STORE_CLASS='django_openid_auth.store.CacheOpenIDStore')
+    def test_make_consumer_uses_configured_store(self):
+        request = RequestFactory().get('/')
+        request.session = {}
+        consumer = make_consumer(request)
+        self.assertIsInstance(consumer.consumer.store, CacheOpenIDStore)
@@ -29,6 +29,7 @@
 
 from __future__ import unicode_literals
 
+from django.conf import settings
 from django.conf.urls import url
 
 from django_openid_auth.views import (
@@ -37,6 +38,12 @@ from django_openid_auth.views import (
     logo,
 )
 
+if getattr(settings, 'OPENID_ASYNC_VIEWS', False):
+    from django_openid_auth.async_views import (  # noqa: F811
+        login_begin,
+        login_complete,
+    )
+
 
 urlpatterns = [
     url(r'^login/$', login_begin, name='openid-login'),
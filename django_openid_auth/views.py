@@ -39,7 +39,6 @@ except ImportError:
 from django.conf import settings
 from django.contrib.auth import (
     REDIRECT_FIELD_NAME, authenticate, login as auth_login)
-from django.contrib.auth.models import Group
 
 try:
     from django.urls import reverse
@@ -49,7 +48,7 @@ except ImportError:
     from django.core.urlresolvers import reverse
 from django.http import HttpResponse, HttpResponseRedirect
 from django.http.request import QueryDict
-from django.shortcuts import render_to_response, render
+from django.shortcuts import render
 from django.template import RequestContext
 try:
     from django.views.decorators.csrf import csrf_exempt
@@ -59,13 +58,21 @@ except ImportError:
 from openid.consumer.consumer import (
     Consumer, SUCCESS, CANCEL, FAILURE)
 from openid.consumer.discover import DiscoveryFailure
-from openid.extensions import sreg, ax, pape
 
-from django_openid_auth import teams
+from django_openid_auth import discovery
+from django_openid_auth.extensions import get_extension_requests
+from django_openid_auth.fetchers import install_fetcher
 from django_openid_auth.forms import OpenIDLoginForm
+from django_openid_auth.instrumentation import (
+    AUTH_LOGIN,
+    AUTHENTICATE,
+    PARSE_OPENID_RESPONSE,
+    login_phase,
+)
 from django_openid_auth.models import UserOpenID
+from django_openid_auth.session import ConsumerSession
 from django_openid_auth.signals import openid_login_complete
-from django_openid_auth.store import DjangoOpenIDStore
+from django_openid_auth.store import get_store
 from django_openid_auth.exceptions import (
     DjangoOpenIDException,
 )
@@ -111,9 +118,17 @@ def sanitise_redirect_url(redirect_to):
 def make_consumer(request):
     """Create an OpenID Consumer object for the given Django request."""
     # Give the OpenID library its own space in the session object.
-    session = request.session.setdefault('OPENID', {})
-    store = DjangoOpenIDStore()
-    return Consumer(session, store)
+    session = ConsumerSession(request.session)
+    install_fetcher()
+    store = get_store()
+    consumer = Consumer(session, store)
+    # Both the initial discovery and any rediscovery needed to verify
+    # the response should go through the discovery cache, or use the
+    # results the async views fetched beforehand.
+    discover = getattr(request, 'openid_discovery', discovery.discover)
+    consumer._discover = discover
+    consumer.consumer._discover = discover
+    return consumer
 
 
 def render_openid_request(request, openid_request, return_to, trust_root=None):
@@ -197,80 +212,8 @@ def login_begin(request, template_name='openid/login.html',
             request, "OpenID discovery error: %s" % (str(exc),), status=500,
             exception=exc)
 
-    # Request some user details.  If the provider advertises support
-    # for attribute exchange, use that.
-    endpoint = openid_request.endpoint
-    if endpoint.supportsType(ax.AXMessage.ns_uri):
-        fetch_request = ax.FetchRequest()
-        # We mark all the attributes as required, since Google ignores
-        # optional attributes.  We request both the full name and
-        # first/last components since some providers offer one but not
-        # the other.
-        for (attr, alias) in [
-                ('http://axschema.org/contact/email', 'email'),
-                ('http://axschema.org/namePerson', 'fullname'),
-                ('http://axschema.org/namePerson/first', 'firstname'),
-                ('http://axschema.org/namePerson/last', 'lastname'),
-                ('http://axschema.org/namePerson/friendly', 'nickname'),
-                # The myOpenID provider advertises AX support, but uses
-                # attribute names from an obsolete draft of the
-                # specification.  We request them for compatibility.
-                ('http://schema.openid.net/contact/email', 'old_email'),
-                ('http://schema.openid.net/namePerson', 'old_fullname'),
-                ('http://schema.openid.net/namePerson/friendly',
-                 'old_nickname')]:
-            fetch_request.add(ax.AttrInfo(attr, alias=alias, required=True))
-
-        # conditionally require account_verified attribute
-        verification_scheme_map = getattr(
-            settings, 'OPENID_VALID_VERIFICATION_SCHEMES', {})
-        valid_schemes = verification_scheme_map.get(
-            endpoint.server_url, verification_scheme_map.get(None, ()))
-        if valid_schemes:
-            # there are valid schemes configured for this endpoint, so
-            # request account_verified status
-            fetch_request.add(ax.AttrInfo(
-                'http://ns.login.ubuntu.com/2013/validation/account',
-                alias='account_verified', required=True))
-
-        openid_request.addExtension(fetch_request)
-    else:
-        sreg_required_fields = []
-        sreg_required_fields.extend(
-            getattr(settings, 'OPENID_SREG_REQUIRED_FIELDS', []))
-        sreg_optional_fields = ['email', 'fullname', 'nickname']
-        sreg_optional_fields.extend(
-            getattr(settings, 'OPENID_SREG_EXTRA_FIELDS', []))
-        sreg_optional_fields = [
-            field for field in sreg_optional_fields
-            if field not in sreg_required_fields]
-        openid_request.addExtension(
-            sreg.SRegRequest(optional=sreg_optional_fields,
-                             required=sreg_required_fields))
-
-    if getattr(settings, 'OPENID_PHYSICAL_MULTIFACTOR_REQUIRED', False):
-        preferred_auth = [
-            pape.AUTH_MULTI_FACTOR_PHYSICAL,
-        ]
-        pape_request = pape.Request(preferred_auth_policies=preferred_auth)
-        openid_request.addExtension(pape_request)
-
-    # Request team info
-    teams_mapping_auto = getattr(
-        settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO', False)
-    teams_mapping_auto_blacklist = getattr(
-        settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING_AUTO_BLACKLIST', [])
-    launchpad_teams = getattr(settings, 'OPENID_LAUNCHPAD_TEAMS_MAPPING', {})
-    if teams_mapping_auto:
-        # ignore launchpad teams. use all django-groups
-        launchpad_teams = dict()
-        all_groups = Group.objects.exclude(
-            name__in=teams_mapping_auto_blacklist)
-        for group in all_groups:
-            launchpad_teams[group.name] = group.name
-
-    if launchpad_teams:
-        openid_request.addExtension(teams.TeamsRequest(launchpad_teams.keys()))
+    for extension in get_extension_requests(openid_request.endpoint):
+        openid_request.addExtension(extension)
 
     # Construct the request completion URL, including the page we
     # should redirect to.
@@ -298,21 +241,24 @@ def login_complete(request, redirect_field_name=REDIRECT_FIELD_NAME,
         render_failure or getattr(settings, 'OPENID_RENDER_FAILURE', None) or
         default_render_failure)
 
-    openid_response = parse_openid_response(request)
+    with login_phase(PARSE_OPENID_RESPONSE, request):
+        openid_response = parse_openid_response(request)
     if not openid_response:
         return render_failure(
             request, 'This is an OpenID relying party endpoint.')
 
     if openid_response.status == SUCCESS:
         try:
-            user = authenticate(openid_response=openid_response)
+            with login_phase(AUTHENTICATE, request):
+                user = authenticate(request, openid_response=openid_response)
         except DjangoOpenIDException as e:
             return render_failure(
                 request, getattr(e, 'message', str(e)), exception=e)
 
         if user is not None:
             if user.is_active:
-                auth_login(request, user)
+                with login_phase(AUTH_LOGIN, request):
+                    auth_login(request, user)
                 response = HttpResponseRedirect(
                     sanitise_redirect_url(redirect_to))
 
@@ -138,11 +138,6 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-# the library python-openid does not support a json session serializer
-# <openid.yadis.manager.YadisServiceManager> is not JSON serializable
-# https://github.com/openid/python-openid/issues/17
-SESSION_SERIALIZER = 'django.contrib.sessions.serializers.PickleSerializer'
-
 AUTHENTICATION_BACKENDS = (
     'django_openid_auth.auth.OpenIDBackend',
     'django.contrib.auth.backends.ModelBackend',